@@ -0,0 +1,108 @@
+from preprocessing import alignment_cache
+from preprocessing import utils
+from preprocessing import feature_store
+from preprocessing import feature_schema
+from preprocessing.features import simple_file_name
+from tree.tree import train_trees
+from . import evaluation as ev
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import sys
+
+# Worker state, set once per process by _init_worker.
+_store = None
+
+
+def cross_validate(cognates_file, ipa_file, out_dir, k=10, n_jobs=None,
+                   threshold=0.4, cache_file=None):
+    """
+    Performs a k-fold cross-validation over the cognate pairs of a word list.
+    The word list is aligned only once, and the context features of each
+    cognate pair are extracted only once. The training matrix of each fold
+    is assembled from these cached rows by index. The folds are trained and
+    evaluated (in both directions) by a pool of worker processes.
+
+    The NLDs per fold as well as their means and standard deviations are
+    saved in {out_dir}/{lang}-{lang}-crossvalidation.csv.
+
+    Keyword arguments:
+    cognates_file: a bilingual word list, as created by merge_lists
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    out_dir: the output directory
+    k: the number of folds (default: 10)
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    threshold: the maximum NED for cognate pairs (default: 0.4)
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    """
+    levels = simple_file_name(cognates_file).split("-")[:2]
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    cognates, _ = alignment_cache.get_cognates(cognates_file, ipa_dict,
+                                               threshold, return_phones=True,
+                                               cache_file=cache_file)
+    rows, offsets = feature_store.build_store(cognates)
+    pairs = [(word_one, word_two) for (_, word_one, word_two, _) in cognates]
+    print("Extracted the features for {} cognate pairs.".format(len(pairs)))
+
+    # contiguous folds, so the last fold corresponds to the default test data
+    folds = np.array_split(np.arange(len(pairs)), k)
+
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    store = (levels, ipa_dict, pairs, rows, offsets)
+    with Pool(min(n_jobs, k), initializer=_init_worker,
+              initargs=(store,)) as pool:
+        results = pool.map(_evaluate_fold, folds)
+
+    write_results(levels, results, out_dir)
+
+
+def write_results(levels, results, out_dir):
+    """Writes the NLDs per fold, their means and standard deviations."""
+    results = np.array(results)
+    directions = ["{} from {}".format(lang_one, lang_two)
+                  for lang_one, lang_two in (levels, levels[::-1])]
+    out_file = "{}/{}-{}-crossvalidation.csv".format(out_dir, *levels)
+    with open(out_file, 'w', encoding='utf-8') as f:
+        f.write('fold,' + ','.join(directions) + '\n')
+        for fold, nlds in enumerate(results):
+            f.write(str(fold) + ',' +
+                    ','.join(str(round(nld, 4)) for nld in nlds) + '\n')
+        f.write('mean,' + ','.join(str(round(x, 4))
+                                   for x in results.mean(axis=0)) + '\n')
+        f.write('std,' + ','.join(str(round(x, 4))
+                                  for x in results.std(axis=0)) + '\n')
+
+    for direction, mean, std in zip(directions, results.mean(axis=0),
+                                    results.std(axis=0)):
+        print("{}: average NLD {} (std {}) over {} folds"
+              .format(direction, round(mean, 2), round(std, 2), len(results)))
+    print("Saved the results in {}.".format(out_file))
+
+
+def _init_worker(store):
+    global _store
+    _store = store
+
+
+def _evaluate_fold(test_idx):
+    levels, ipa_dict, pairs, rows, offsets = _store
+    train_idx = np.setdiff1d(np.arange(len(pairs)), test_idx)
+    data = rows[feature_store.row_indices(offsets, train_idx)]
+    classifiers = train_trees(data, feature_schema.for_levels(*levels), levels)
+    test_data = [pairs[i] for i in test_idx]
+    average_nlds = []
+    for lang_one in levels:
+        nlds = ev.evaluate_words(lang_one, levels, test_data,
+                                 classifiers[lang_one], ipa_dict)
+        average_nlds.append(sum(nlds) / len(nlds))
+    return average_nlds
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE OUTPUT_DIR '
+                         '[N_FOLDS] [N_JOBS]\n' % sys.argv[0])
+        sys.exit(1)
+    k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    n_jobs = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    cross_validate(sys.argv[1], sys.argv[2], sys.argv[3], k, n_jobs)
@@ -0,0 +1,108 @@
+from preprocessing import alignment_cache
+from preprocessing import utils
+from preprocessing.features import simple_file_name
+from . import evaluation as ev
+from . import metrics
+from multiprocessing import Pool, cpu_count
+import sys
+
+# Worker state, set once per process by _init_worker.
+_classifiers = None
+_schemas = None
+_ipa_dict = None
+
+
+def evaluate_pair(cognates_file, ipa_file, out_dir, n_jobs=None,
+                  threshold=0.4, shard_size=8, multi_output=False,
+                  cache_file=None, beam_width=1):
+    """
+    Evaluates the predictions for both directions of a language pair,
+    e.g. deu from swe and swe from deu. The word list is aligned only once,
+    and the test words of both directions are split into shards that are
+    evaluated by a pool of worker processes.
+
+    The NLDs and predicted words are collected per word in the order of the
+    test data, so the results do not depend on the number of workers.
+    Besides the average NLD, the metrics of metrics.compute_metrics are
+    saved for each direction.
+
+    Keyword arguments:
+    cognates_file: a bilingual word list, as created by merge_lists
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    out_dir: the directory for the {lang}-{lang}-evaluation.csv files
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    threshold: the maximum NED for cognate pairs (default: 0.4)
+    shard_size: the number of test words per task (default: 8)
+    multi_output: use one multi-output tree per language (default: False)
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    beam_width: if > 1, the words are predicted with a beam search
+                (default: 1)
+    """
+    levels = simple_file_name(cognates_file).split("-")[:2]
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    cognate_data, _ = alignment_cache.get_cognates(cognates_file, ipa_dict,
+                                                   threshold,
+                                                   return_phones=True,
+                                                   cache_file=cache_file)
+    test_data = ev.test_split(cognate_data)
+    for lang in levels:
+        ev.load_schema(lang, levels)
+
+    shards = [test_data[i:i + shard_size]
+              for i in range(0, len(test_data), shard_size)]
+    tasks = [(lang_one, levels, shard, beam_width)
+             for lang_one in levels for shard in shards]
+
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    with Pool(n_jobs, initializer=_init_worker,
+              initargs=(levels, ipa_file, multi_output)) as pool:
+        # map returns the results in the order of the tasks
+        results = pool.map(_evaluate_shard, tasks)
+
+    for lang_one, lang_two in (levels, levels[::-1]):
+        nlds, predicted_words, target_words = [], [], []
+        for (lang, _, _, _), result in zip(tasks, results):
+            if lang == lang_one:
+                nlds += result[0]
+                predicted_words += result[1]
+                target_words += result[2]
+        ev.write_results(lang_one, lang_two, nlds, out_dir)
+        metrics.write_metrics(metrics.compute_metrics(predicted_words,
+                                                      target_words, nlds),
+                              lang_one, lang_two, out_dir)
+
+
+def _init_worker(levels, ipa_file, multi_output):
+    """Loads the IPA table and the classifiers once per worker process."""
+    global _classifiers, _schemas, _ipa_dict
+    _ipa_dict = utils.read_ipa_dict(ipa_file)
+    _classifiers = {lang: ev.load_classifiers(lang, multi_output)
+                    for lang in levels}
+    _schemas = {lang: ev.load_schema(lang, levels) for lang in levels}
+
+
+def _evaluate_shard(task):
+    lang_one, levels, shard, beam_width = task
+    predicted_words, target_words = ev.predict_words(
+        lang_one, levels, shard, _classifiers[lang_one], beam_width,
+        _schemas[lang_one])
+    nlds = ev.word_nlds(predicted_words, target_words, _ipa_dict)
+    return nlds, predicted_words, target_words
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE OUTPUT_DIR '
+                         '[N_JOBS [BEAM_WIDTH]] [multi] [CACHE_FILE]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+    options = sys.argv[4:]
+    numbers = [int(option) for option in options if option.isdigit()]
+    cache_files = [option for option in options
+                   if not option.isdigit() and option != 'multi']
+    evaluate_pair(sys.argv[1], sys.argv[2], sys.argv[3],
+                  numbers[0] if numbers else None,
+                  multi_output='multi' in options,
+                  cache_file=cache_files[0] if cache_files else None,
+                  beam_width=numbers[1] if len(numbers) > 1 else 1)
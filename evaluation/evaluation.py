@@ -1,79 +1,356 @@
 import numpy as np
+import os
 import pickle
 import sys
+from preprocessing import alignment_cache
+from preprocessing import feature_schema
 from preprocessing import transform_ipa
 from preprocessing import utils
+from . import metrics
 from preprocessing.phone import Phone
+from preprocessing import candidate_contexts
 from preprocessing.candidate_contexts import get_features
-from preprocessing.features import header_list
 from operator import itemgetter
 
+# store the labels of all phonetic features except sound type
+phonetic_features = transform_ipa.phonetic_features[1:]
+clf_dir = "evaluation/classifiers"
 
-def evaluation(lang_one, lang_two, cognates_file, ipa_file, out_file):
+
+def evaluation(lang_one, lang_two, cognates_file, ipa_file, out_file,
+               multi_output=False, cache_file=None, beam_width=1):
     """
     Generate words using the cognates from the second language and
     decision trees that describe sound transformation between two languages.
-    Calculate the accuracy of predicted words using average Needleman-Wunsch.
+    Calculate the accuracy of predicted words using average Needleman-Wunsch,
+    and further metrics (see metrics.compute_metrics).
+    If multi_output, a single tree predicts all features of a sound.
+    If cache_file is given, the alignments are looked up in that
+    alignment_cache.AlignmentCache database.
+    If beam_width > 1, the words are predicted with a beam search.
     """
     ipa_dict = utils.read_ipa_dict(ipa_file)
-    cognate_data, _ = utils.get_cognates(cognates_file, ipa_dict, 0.4, return_phones=True)
-    cognate_pairs = [(word_one, word_two) for (_, word_one, word_two, _) in cognate_data]
+    cognate_data, _ = alignment_cache.get_cognates(cognates_file, ipa_dict, 0.4,
+                                                   return_phones=True, cache_file=cache_file)
     # Getting the names of levels from the cognates_file string
     levels = cognates_file.split("/")[-1].split("-")[:2]
 
-    train_data_size = round(len(cognate_pairs) * 0.9)
-    test_data = cognate_pairs[train_data_size:]
-    total_nld = 0.0
+    test_data = test_split(cognate_data)
+    classifiers = load_classifiers(lang_one, multi_output)
+    schema = load_schema(lang_one, levels)
+    predicted_words, target_words = predict_words(lang_one, levels,
+                                                  test_data, classifiers,
+                                                  beam_width, schema)
+    nlds = word_nlds(predicted_words, target_words, ipa_dict)
+    write_results(lang_one, lang_two, nlds, out_file)
+    metrics.write_metrics(metrics.compute_metrics(predicted_words,
+                                                  target_words, nlds),
+                          lang_one, lang_two, out_file)
+
+
+def test_split(cognate_data, train_pct=0.9):
+    """
+    Returns the word pairs that are not used for training, i.e. the
+    cognate pairs following the first `train_pct` of the data.
+    """
+    cognate_pairs = [(word_one, word_two) for (_, word_one, word_two, _) in cognate_data]
+    train_data_size = round(len(cognate_pairs) * train_pct)
+    return cognate_pairs[train_data_size:]
+
+
+def load_classifiers(lang, multi_output=False):
+    """
+    Loads the decision trees predicting the phonetic features of `lang`.
+    If a tree was saved as a lookup table (see tree.lookup.LookupTree),
+    the lookup table is loaded instead, which predicts the same classes
+    faster.
+
+    Returns:
+    A dict(str -> sklearn.tree.DecisionTreeClassifier)
+    mapping the feature names to the classifiers, or, if multi_output,
+    the single tree that predicts all features.
+    """
+    if multi_output:
+        return _load_classifier("{}/{}_all".format(clf_dir, lang))
+    classifiers = {}
+    for feature_name in phonetic_features:
+        classifiers[feature_name] = _load_classifier(
+            "{}/{}_{}".format(clf_dir, lang, feature_name))
+    return classifiers
+
+
+def _load_classifier(clf_file):
+    if os.path.exists(clf_file + '_lookup.pickle'):
+        clf_file += '_lookup'
+    with open(clf_file + '.pickle', 'rb') as handle:
+        return pickle.load(handle)
 
+
+def load_schema(lang, levels):
+    """
+    Returns the schema of the columns the classifiers of `lang` were trained
+    on (which may leave out some columns, see tree.tree.reduce_columns),
+    making sure that it describes the feature matrices for `levels`.
+    If no schema was saved, all columns are used.
+    """
+    schema = feature_schema.for_levels(*levels)
+    schema_file = "{}/{}_schema.pickle".format(clf_dir, lang)
+    if not os.path.exists(schema_file):
+        return schema
+    saved = feature_schema.load(schema_file)
+    if saved != schema:
+        raise ValueError("The classifiers in {} were trained on different "
+                         "columns.".format(clf_dir))
+    return saved
+
+
+def evaluate_words(lang_one, levels, test_data, classifiers, ipa_dict,
+                   beam_width=1, schema=None):
+    """
+    Predicts the `lang_one` words for the given test pairs and compares them
+    to the actual words.
+
+    Keyword arguments:
+    lang_one: the language whose words are predicted
+    levels: the languages of the word list, in the order of its columns
+    test_data: a list(tuple(list(Phone), list(Phone))) of aligned word pairs,
+               in the order of `levels`
+    classifiers: the classifiers as returned by load_classifiers
+    ipa_dict: a dict(str -> Phone) as created by utils.read_ipa_dict
+    beam_width: the number of partial words beam_search keeps per word
+                (default: 1, i.e. the words are predicted greedily)
+    schema: the feature_schema.FeatureSchema of the classifiers, as returned
+            by load_schema (default: None, i.e. all columns)
+
+    Returns:
+    A list(float) containing the NLD for each test pair.
+    """
+    return word_nlds(*predict_words(lang_one, levels, test_data, classifiers,
+                                    beam_width, schema), ipa_dict)
+
+
+def predict_words(lang_one, levels, test_data, classifiers, beam_width=1,
+                  schema=None):
+    """
+    Predicts the `lang_one` words for the given test pairs
+    (see evaluate_words for the arguments).
+
+    Returns:
+    The predicted words and the actual words (lists of list(Phone)s).
+    """
     # Storing source and target words
     if lang_one == levels[0]:
-        t_words, s_words = zip(*test_data)
+        src_words = [word_two for _, word_two in test_data]
+        target_words = [word_one for word_one, _ in test_data]
     else:
-        s_words, t_words = zip(*test_data)
+        src_words = [word_one for word_one, _ in test_data]
+        target_words = [word_two for _, word_two in test_data]
+
+    # With a beam width of 1, beam_search predicts the same words as
+    # predict_word, but it calls each classifier once per position for all
+    # words, which matters for ensembles.
+    predicted_words = beam_search(src_words, lang_one, levels, classifiers,
+                                  beam_width, schema)
+    return predicted_words, target_words
+
 
-    for pair_idx, _ in enumerate(test_data):
-        src_word = s_words[pair_idx]
-        target_word = t_words[pair_idx]
+def word_nlds(predicted_words, target_words, ipa_dict):
+    """Returns the NLD between each predicted word and the actual word."""
+    return [utils.lev_distance(predicted_word, target_word, ipa_dict=ipa_dict)
+            for predicted_word, target_word in zip(predicted_words,
+                                                   target_words)]
 
-        w_length = len(src_word)
-        predicted_word = _generate_template(w_len=w_length)
-        header = header_list(levels)
 
-        # store the labels of all phonetic features except sound type
-        phonetic_features = transform_ipa.phonetic_features[1:]
+def predict_word(src_word, lang_one, levels, classifiers, schema=None):
+    """
+    Predicts the `lang_one` counterpart of the given word, sound by sound.
+
+    Keyword arguments:
+    src_word: the source word, a list(Phone) starting with a word boundary
+    lang_one: the language whose word is predicted
+    levels: the languages of the word list, in the order of its columns
+    classifiers: the classifiers as returned by load_classifiers
+    schema: the schema of the classifiers (default: None, i.e. all columns)
 
-        for sound_idx in range(w_length - 1):
-            if lang_one in ["ukr", "swe"]:
-                features_matrix = get_features(src_word, predicted_word)
-            else:
-                features_matrix = get_features(predicted_word, src_word)
-            sound = []
+    Returns:
+    The predicted word as a list(Phone).
+    """
+    w_length = len(src_word)
+    predicted_word = _generate_template(w_len=w_length)
 
-            for feature_name in phonetic_features:
-                removed_indices = [i for i, x in enumerate(header)
-                                   if x.startswith(lang_one + "_itself") or
-                                   x.startswith(lang_one + "_prevOrSelf")]
-                label_col = header.index("{}_itself_{}".format(lang_one, feature_name))
-                removed_indices.append(label_col)
+    # The training columns are the same for every phonetic feature of
+    # lang_one (the label column is one of the lang_one_itself columns).
+    if schema is None:
+        schema = feature_schema.for_levels(*levels)
+    data_cols, _ = schema.data_columns(schema.label_names(lang_one)[0])
 
-                data = np.delete(features_matrix, removed_indices, 1)
-                data = np.array(data[sound_idx, :]).reshape((1, -1))
+    for sound_idx in range(w_length - 1):
+        if lang_one == levels[0]:
+            features_matrix = get_features(predicted_word, src_word)
+        else:
+            features_matrix = get_features(src_word, predicted_word)
 
-                clf_file = "evaluation/classifiers/{}_{}.pickle".format(lang_one, feature_name)
-                with open(clf_file, 'rb') as handle:
-                    clf = pickle.load(handle)
+        data = features_matrix[sound_idx:sound_idx + 1, data_cols]
+        sound = list(predict_features(classifiers, data)[0])
 
-                predicted_feature = clf.predict(data)
-                sound.append(predicted_feature[0])
+        sound = [_detect_sound_type(sound)] + sound
+        predicted_word[sound_idx + 1] = Phone(*sound)
 
-            sound = [_detect_sound_type(sound)] + sound
-            predicted_word[sound_idx + 1] = Phone(*sound)
+    return predicted_word
 
-        nld = utils.lev_distance(predicted_word, target_word, ipa_dict=ipa_dict)
-        total_nld += nld
 
-    n_words = len(test_data)
-    average_nld = total_nld / n_words
+def predict_features(classifiers, data):
+    """
+    Predicts the phonetic features (except for the sound type) of the sounds
+    described by the rows of `data`.
+
+    Keyword arguments:
+    classifiers: the classifiers as returned by load_classifiers
+    data: a numpy matrix containing the training columns
+
+    Returns:
+    A numpy matrix with one row per sound and one column per feature
+    in `phonetic_features`.
+    """
+    if isinstance(classifiers, dict):
+        return np.column_stack([classifiers[feature_name].predict(data)
+                                for feature_name in phonetic_features])
+    # a single multi-output tree
+    return classifiers.predict(data)
+
+
+def beam_search(src_words, lang_one, levels, classifiers, beam_width=5,
+                schema=None):
+    """
+    Predicts the `lang_one` counterparts of the given words, keeping the
+    `beam_width` most probable partial words per source word. A sound is
+    scored with the sum of the log probabilities of its phonetic features.
+
+    All partial words of all source words are extended together: for each
+    position, the probabilities are computed with one predict_proba call
+    per classifier. The features of the source words are computed once,
+    and each partial word keeps the context of its next sound (see
+    candidate_contexts.context_row), so that only one row is computed per
+    partial word and position.
+
+    Keyword arguments:
+    src_words: the source words, list(Phone)s starting with a word boundary
+    lang_one: the language whose words are predicted
+    levels: the languages of the word list, in the order of its columns
+    classifiers: the classifiers as returned by load_classifiers
+    beam_width: the number of partial words per source word (default: 5)
+    schema: the schema of the classifiers (default: None, i.e. all columns)
+
+    Returns:
+    A list containing the most probable word (a list(Phone)) per source word.
+    """
+    if schema is None:
+        schema = feature_schema.for_levels(*levels)
+    data_cols, _ = schema.data_columns(schema.label_names(lang_one)[0])
+    src_matrices = [candidate_contexts.process_word(
+        src_word, candidate_contexts.n_word_features)
+        for src_word in src_words]
+    # one list of (log probability, predicted word, context of the next
+    # sound) per source word
+    beams = []
+    for src_word in src_words:
+        template = _generate_template(w_len=len(src_word))
+        beams.append([(0.0, template,
+                       candidate_contexts.initial_context(template))])
+    max_len = max([len(src_word) for src_word in src_words], default=1)
+
+    for sound_idx in range(max_len - 1):
+        active = [w for w, src_word in enumerate(src_words)
+                  if sound_idx < len(src_word) - 1]
+        predicted_rows = []
+        src_rows = []
+        for w in active:
+            for _, predicted_word, context in beams[w]:
+                predicted_rows.append(candidate_contexts.context_row(
+                    predicted_word[sound_idx + 1], context)[0])
+                src_rows.append(src_matrices[w][sound_idx])
+        if lang_one == levels[0]:
+            rows = np.column_stack((predicted_rows, src_rows))
+        else:
+            rows = np.column_stack((src_rows, predicted_rows))
+        log_probs, classes = predict_log_proba(classifiers, rows[:, data_cols])
+        sound_scores, sounds = best_sounds(log_probs, classes, beam_width)
+        sound_scores = sound_scores.tolist()
+        sounds = sounds.tolist()
+
+        row = 0
+        for w in active:
+            candidates = []
+            for score, predicted_word, context in beams[w]:
+                for sound_score, sound in zip(sound_scores[row], sounds[row]):
+                    candidates.append((score + sound_score, predicted_word,
+                                       context, sound))
+                row += 1
+            # a stable sort keeps the order of the candidates for equal scores
+            candidates.sort(key=lambda candidate: -candidate[0])
+            beams[w] = []
+            for score, predicted_word, context, sound in candidates[:beam_width]:
+                predicted_word = list(predicted_word)
+                phone = Phone(_detect_sound_type(sound), *sound)
+                predicted_word[sound_idx + 1] = phone
+                _, context = candidate_contexts.context_row(phone, context)
+                beams[w].append((score, predicted_word, context))
+
+    return [beam[0][1] for beam in beams]
+
+
+def predict_log_proba(classifiers, data):
+    """
+    Returns the log probabilities of the values of each phonetic feature
+    (a list of numpy matrices, one per feature in `phonetic_features`)
+    and the values themselves (a list of numpy arrays).
+    """
+    if isinstance(classifiers, dict):
+        probs = [classifiers[feature_name].predict_proba(data)
+                 for feature_name in phonetic_features]
+        classes = [classifiers[feature_name].classes_
+                   for feature_name in phonetic_features]
+    else:
+        # a single multi-output tree
+        probs = classifiers.predict_proba(data)
+        classes = classifiers.classes_
+    with np.errstate(divide='ignore'):
+        return [np.log(p) for p in probs], classes
+
+
+def best_sounds(log_probs, classes, k):
+    """
+    Returns the `k` most probable combinations of phonetic feature values
+    for each row of the log probabilities (as returned by
+    predict_log_proba). The combinations are built feature by feature,
+    keeping only the `k` best partial combinations, for all rows at once.
+
+    Returns:
+    scores: a numpy matrix (n_rows x k) with the log probabilities of the
+            combinations, in descending order
+    values: a numpy array (n_rows x k x n_features) with the combinations
+    """
+    n_rows = len(log_probs[0])
+    rows = np.arange(n_rows)[:, None]
+    scores = np.zeros((n_rows, 1))
+    values = np.zeros((n_rows, 1, 0), dtype=int)
+    for feature_log_probs, feature_classes in zip(log_probs, classes):
+        n_classes = feature_log_probs.shape[1]
+        total = (scores[:, :, None] +
+                 feature_log_probs[:, None, :]).reshape(n_rows, -1)
+        keep = np.argsort(-total, axis=1, kind='stable')[:, :k]
+        values = np.concatenate(
+            [values[rows, keep // n_classes],
+             np.asarray(feature_classes)[keep % n_classes][:, :, None]],
+            axis=2)
+        scores = total[rows, keep]
+    return scores, values
+
+
+def write_results(lang_one, lang_two, nlds, out_file):
+    """Writes the average NLD to {out_file}/{lang_one}-{lang_two}-evaluation.csv"""
+    n_words = len(nlds)
+    average_nld = sum(nlds) / n_words
 
     intro = "Results for '{}' based on '{}' language".format(lang_one, lang_two)
     result = "{}: average NLD for {} test words".format(round(average_nld, 2), n_words)
@@ -88,7 +365,7 @@ def evaluation(lang_one, lang_two, cognates_file, ipa_file, out_file):
 
 def _generate_template(w_len):
     """
-    Generate a template word. First phone is a word boundary. 
+    Generate a template word. First phone is a word boundary.
     All the other phones are dots. Later dots are replaced
     by predicted sounds.
 
@@ -119,13 +396,9 @@ def _detect_sound_type(sound_features):
 if __name__ == "__main__":
     if len(sys.argv) < 5:
         sys.stderr.write('Usage: %s TARGET_LANGUAGE SOURCE_LANGUAGE BILINGUAL_WORD_LIST '
-                         'IPA_FILE OUTPUT_DIR\n' % sys.argv[0])
+                         'IPA_FILE OUTPUT_DIR [multi] [BEAM_WIDTH]\n' % sys.argv[0])
         sys.exit(1)
-    evaluation(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5])
-
-
-
-
-
-
-
+    options = sys.argv[6:]
+    beam_widths = [int(option) for option in options if option.isdigit()]
+    evaluation(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5],
+               'multi' in options, beam_width=beam_widths[0] if beam_widths else 1)
@@ -0,0 +1,122 @@
+from preprocessing import transform_ipa as tipa
+import numpy as np
+import json
+
+# the edges of the intervals of the NLD histogram
+nld_bins = np.linspace(0, 1, 11)
+
+
+def compute_metrics(predicted_words, target_words, nlds):
+    """
+    Compares predicted words to the actual words, sound by sound. The sounds
+    of all words are stacked into two matrices (one column per phonetic
+    feature), so that all metrics are computed at once.
+
+    Keyword arguments:
+    predicted_words: a list of predicted words (list(Phone)s)
+    target_words: a list of the actual words (list(Phone)s, aligned to the
+                  source words and thus as long as the predicted words)
+    nlds: a list(float) containing the NLD of each word pair
+
+    Returns:
+    A dict containing
+    - n_words, n_sounds, average_nld
+    - exact_word_accuracy: the fraction of words whose sounds are all
+      predicted correctly
+    - feature_accuracy: a dict(str -> float) with the fraction of sounds for
+      which each phonetic feature is predicted correctly
+    - confusion: a dict(str -> list(list(int))) with the confusion matrix of
+      each phonetic feature (rows: actual values, columns: predicted values,
+      in the order of transform_ipa.all_features)
+    - position_error_rate: a list(float) with the fraction of wrongly
+      predicted sounds at each position (the first sound of a word is at
+      position 0)
+    - nld_histogram: the number of words per NLD interval, for the
+      intervals in nld_bins
+    """
+    # the word boundaries at the beginning are not predicted
+    lengths = np.array([len(word) - 1 for word in target_words],
+                       dtype=np.int64)
+    predicted = _stack(predicted_words)
+    target = _stack(target_words)
+    word_idx = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    positions = np.arange(len(word_idx)) - starts[word_idx]
+
+    correct = predicted == target
+    sound_correct = correct.all(axis=1)
+    # a word is correct if none of its sounds is wrong
+    wrong_per_word = np.bincount(word_idx, weights=~sound_correct,
+                                 minlength=len(lengths))
+    sounds_per_position = np.bincount(positions)
+    errors_per_position = np.bincount(positions, weights=~sound_correct,
+                                      minlength=len(sounds_per_position))
+
+    confusion = {}
+    for f, (feature, values) in enumerate(zip(tipa.phonetic_features,
+                                              tipa.all_features)):
+        n_values = len(values)
+        counts = np.bincount(target[:, f] * n_values + predicted[:, f],
+                             minlength=n_values * n_values)
+        confusion[feature] = counts.reshape(n_values, n_values).tolist()
+
+    n_sounds = len(word_idx)
+    nlds = np.asarray(nlds, dtype=float)
+    return {
+        'n_words': len(lengths),
+        'n_sounds': n_sounds,
+        'average_nld': float(nlds.mean()) if len(nlds) else 0.0,
+        'exact_word_accuracy':
+            float(np.mean(wrong_per_word == 0)) if len(lengths) else 0.0,
+        'feature_accuracy': dict(zip(
+            tipa.phonetic_features,
+            (correct.sum(axis=0) / max(n_sounds, 1)).tolist())),
+        'confusion': confusion,
+        'position_error_rate': (errors_per_position /
+                                np.maximum(sounds_per_position, 1)).tolist(),
+        'nld_histogram': np.histogram(np.clip(nlds, 0, 1),
+                                      bins=nld_bins)[0].tolist(),
+    }
+
+
+def write_metrics(metrics, lang_one, lang_two, out_dir):
+    """
+    Saves the metrics in {out_dir}:
+    - {lang_one}-{lang_two}-metrics.json: all metrics
+    - {lang_one}-{lang_two}-feature-accuracy.csv: the accuracy of each phonetic
+      feature
+    - {lang_one}-{lang_two}-confusion.csv: the non-zero entries of the
+      confusion matrices
+    - {lang_one}-{lang_two}-positions.csv: the error rate per position
+    """
+    prefix = '{}/{}-{}-'.format(out_dir, lang_one, lang_two)
+    with open(prefix + 'metrics.json', 'w', encoding='utf-8') as f:
+        json.dump(dict(metrics, lang=lang_one, source_lang=lang_two,
+                       nld_bins=nld_bins.tolist()), f, indent=2)
+
+    with open(prefix + 'feature-accuracy.csv', 'w', encoding='utf-8') as f:
+        f.write('feature,accuracy\n')
+        for feature, accuracy in metrics['feature_accuracy'].items():
+            f.write('{},{}\n'.format(feature, round(accuracy, 4)))
+
+    with open(prefix + 'confusion.csv', 'w', encoding='utf-8') as f:
+        f.write('feature,actual,predicted,count\n')
+        for feature, values in zip(tipa.phonetic_features, tipa.all_features):
+            names = ['N/A' if value == '' else value for value in values]
+            matrix = np.array(metrics['confusion'][feature])
+            for actual, predicted in zip(*np.nonzero(matrix)):
+                f.write('{},{},{},{}\n'.format(feature, names[actual],
+                                               names[predicted],
+                                               matrix[actual, predicted]))
+
+    with open(prefix + 'positions.csv', 'w', encoding='utf-8') as f:
+        f.write('position,error_rate\n')
+        for position, rate in enumerate(metrics['position_error_rate']):
+            f.write('{},{}\n'.format(position, round(rate, 4)))
+    print("Saved the metrics in {}.".format(prefix + 'metrics.json'))
+
+
+def _stack(words):
+    """Returns the features of all sounds except the word boundaries."""
+    return np.array([phone.features() for word in words for phone in word[1:]],
+                    dtype=np.int64).reshape(-1, len(tipa.phonetic_features))
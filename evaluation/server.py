@@ -0,0 +1,231 @@
+from preprocessing import utils
+from preprocessing.ipa_decoder import SymbolDecoder
+from preprocessing.phon_inventory import process_line
+from . import evaluation as ev
+import json
+import queue
+import socketserver
+import sys
+import threading
+import time
+
+
+class Predictor(object):
+    """
+    Keeps the IPA table and the classifiers of a language pair in memory
+    and predicts the words of one language from the words of the other one.
+    """
+
+    def __init__(self, levels, ipa_file, multi_output=False):
+        """
+        Keyword arguments:
+        levels: the languages, in the order of the columns of the word list
+                the classifiers were trained on
+        ipa_file: the CSV file created by transform_ipa.transform_ipa
+        multi_output: use one multi-output tree per language (default: False)
+        """
+        self.levels = list(levels)
+        self.ipa_dict = utils.read_ipa_dict(ipa_file)
+        self.decoder = SymbolDecoder(self.ipa_dict)
+        self.classifiers = {lang: ev.load_classifiers(lang, multi_output)
+                            for lang in self.levels}
+        self.schemas = {lang: ev.load_schema(lang, self.levels)
+                        for lang in self.levels}
+
+    def tokenize(self, word):
+        """
+        Transforms an IPA string into a list(Phone) starting with a word
+        boundary, like the source words of the evaluation.
+        """
+        return [utils.to_phone(symbol, self.ipa_dict)
+                for symbol in ['#'] + process_line(utils.clean_word(word))]
+
+    def predict(self, src_words, lang_one):
+        """
+        Predicts the `lang_one` counterparts of the given (tokenized) words.
+        All words are predicted together, with one predict call per
+        classifier and position.
+
+        Returns:
+        A list(str) containing the predicted words in IPA (each predicted
+        sound is replaced by the nearest IPA symbol).
+        """
+        predicted_words = ev.beam_search(src_words, lang_one, self.levels,
+                                         self.classifiers[lang_one], 1,
+                                         self.schemas[lang_one])
+        return self.decoder.decode_words(predicted_words)
+
+    def answer(self, requests):
+        """
+        Answers a batch of requests of the form
+        {"id": ..., "lang": "deu", "word": "..."}, where "lang" is the
+        language whose word is predicted and "id" is optional.
+
+        Returns:
+        A list containing one response per request:
+        {"id": ..., "lang": ..., "word": ..., "prediction": "..."}
+        or, if the request cannot be answered, {"id": ..., "error": "..."}.
+        """
+        responses = [None] * len(requests)
+        by_lang = {}
+        for i, request in enumerate(requests):
+            lang_one = request.get('lang')
+            if 'error' in request or not isinstance(request.get('word'), str):
+                responses[i] = _error(request, "Invalid request")
+                continue
+            if lang_one not in self.levels:
+                responses[i] = _error(request,
+                                      "Unknown language: {}".format(lang_one))
+                continue
+            try:
+                src_word = self.tokenize(request['word'])
+            except KeyError as e:
+                responses[i] = _error(request,
+                                      "Unknown IPA symbol: {}".format(e))
+                continue
+            by_lang.setdefault(lang_one, []).append((i, src_word))
+        for lang_one, words in by_lang.items():
+            predictions = self.predict([word for _, word in words], lang_one)
+            for (i, _), prediction in zip(words, predictions):
+                responses[i] = {'id': requests[i].get('id'),
+                                'lang': lang_one,
+                                'word': requests[i]['word'],
+                                'prediction': prediction}
+        return responses
+
+
+class Batcher(object):
+    """
+    Collects the requests of several threads and answers them in batches:
+    after the first request of a batch arrives, further requests are
+    collected for up to `max_delay` seconds (or until there are
+    `max_batch` of them).
+    """
+
+    def __init__(self, predictor, max_batch=256, max_delay=0.002):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit_async(self, request, callback):
+        """Calls `callback` with the response once it is ready."""
+        self.queue.put((request, callback))
+
+    def submit(self, request):
+        """Returns the response to a request."""
+        done = threading.Event()
+        result = []
+
+        def callback(response):
+            result.append(response)
+            done.set()
+
+        self.submit_async(request, callback)
+        done.wait()
+        return result[0]
+
+    def wait(self):
+        """Waits until all submitted requests have been answered."""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                responses = self.predictor.answer([r for r, _ in batch])
+            except Exception as e:
+                responses = [_error(request, e) for request, _ in batch]
+            for (_, callback), response in zip(batch, responses):
+                callback(response)
+                self.queue.task_done()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answers the JSON lines sent over one connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.decode('utf-8').strip()
+            if not line:
+                continue
+            response = self.server.batcher.submit(_parse(line))
+            self.wfile.write((json.dumps(response, ensure_ascii=False) +
+                              '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_socket(batcher, port):
+    """
+    Answers JSON lines (one request per line, see Predictor.answer) sent to
+    localhost:`port`. Every connection is handled by its own thread, and the
+    requests of concurrent connections are batched.
+    """
+    with _Server(('127.0.0.1', port), _Handler) as server:
+        server.batcher = batcher
+        print("Listening on 127.0.0.1:{}.".format(port), file=sys.stderr)
+        server.serve_forever()
+
+
+def serve_stdio(batcher, in_stream=sys.stdin, out_stream=sys.stdout):
+    """
+    Answers JSON lines read from `in_stream` and writes the responses to
+    `out_stream`, in the order of the requests. The requests are not
+    answered one by one, so a client can send several of them before
+    reading the responses.
+    """
+    lock = threading.Lock()
+
+    def write(response):
+        with lock:
+            out_stream.write(json.dumps(response, ensure_ascii=False) + '\n')
+            out_stream.flush()
+
+    for line in in_stream:
+        line = line.strip()
+        if line:
+            batcher.submit_async(_parse(line), write)
+    batcher.wait()
+
+
+def _parse(line):
+    """Parses a request; invalid JSON becomes a request with an error."""
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return {'error': 'Invalid JSON'}
+    return request if isinstance(request, dict) else {'error': 'Invalid JSON'}
+
+
+def _error(request, error):
+    return {'id': request.get('id'), 'error': request.get('error', str(error))}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s LANGUAGE_1 LANGUAGE_2 IPA_FILE [PORT] '
+                         '[multi]\n' % sys.argv[0])
+        sys.exit(1)
+    options = sys.argv[4:]
+    ports = [int(option) for option in options if option.isdigit()]
+    predictor = Predictor(sys.argv[1:3], sys.argv[3], 'multi' in options)
+    batcher = Batcher(predictor)
+    if ports:
+        serve_socket(batcher, ports[0])
+    else:
+        serve_stdio(batcher)
@@ -0,0 +1,145 @@
+from preprocessing import alignment_cache
+from preprocessing import feature_schema
+from preprocessing import feature_store
+from preprocessing import utils
+from preprocessing.features import simple_file_name
+from tree.tree import default_params, train_trees
+from . import evaluation as ev
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import itertools
+import random
+import sys
+
+# The parameter values that are tried for the decision trees.
+default_grid = {'criterion': ['entropy', 'gini'],
+                'min_samples_leaf': [0.002, 0.005, 0.01, 0.02, 0.05],
+                'max_depth': [None, 8, 16],
+                'min_impurity_decrease': [0.0, 0.001, 0.01]}
+
+# Worker state, set once per process by _init_worker.
+_store = None
+
+
+def sweep(cognates_file, ipa_file, out_dir, grid=default_grid, n_samples=0,
+          n_jobs=None, threshold=0.4, seed=0, cache_file=None, train_pct=0.9):
+    """
+    Searches for good decision tree parameters. For each configuration,
+    the trees for all phonetic features of both languages are trained on the
+    training data and evaluated (in both directions) on the test data
+    (see evaluation.test_split), using the average NLD of the predicted
+    words.
+
+    The word list is aligned only once, and the features of the training
+    data are extracted only once, from the same split as the test data, so
+    that no test word is part of the training data. The configurations are
+    evaluated by a pool of worker processes, and the results are saved in
+    {out_dir}/{lang}-{lang}-sweep.csv.
+
+    Keyword arguments:
+    cognates_file: a bilingual word list, as created by merge_lists
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    out_dir: the output directory
+    grid: a dict(str -> list) containing the values to try per
+          DecisionTreeClassifier parameter (default: default_grid)
+    n_samples: the number of randomly sampled configurations
+               (default: 0, i.e. a full grid search)
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    threshold: the maximum NED for cognate pairs (default: 0.4)
+    seed: the random seed for sampling the configurations (default: 0)
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    train_pct: percentage of the cognate pairs that are used for training
+               (default: 0.9)
+    """
+    levels = simple_file_name(cognates_file).split("-")[:2]
+
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    cognate_data, _ = alignment_cache.get_cognates(cognates_file, ipa_dict,
+                                                   threshold,
+                                                   return_phones=True,
+                                                   cache_file=cache_file)
+    test_data = ev.test_split(cognate_data, train_pct)
+    train_data = cognate_data[:len(cognate_data) - len(test_data)]
+    data, _ = feature_store.build_store(train_data)
+    schema = feature_schema.for_levels(*levels)
+    print("Extracted the features for {} out of {} cognate pairs."
+          .format(len(train_data), len(cognate_data)))
+
+    configs = configurations(grid, n_samples, seed)
+    print("Evaluating {} configurations.".format(len(configs)))
+
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    store = (levels, ipa_dict, schema, data, test_data)
+    with Pool(n_jobs, initializer=_init_worker, initargs=(store,)) as pool:
+        results = pool.map(_evaluate_config, configs)
+
+    write_results(levels, configs, results, out_dir)
+
+
+def configurations(grid, n_samples=0, seed=0):
+    """
+    Returns a list(dict) of parameter configurations, either all
+    combinations of the values in `grid` or `n_samples` of them,
+    drawn at random.
+    """
+    names = sorted(grid)
+    configs = [dict(zip(names, values))
+               for values in itertools.product(*[grid[n] for n in names])]
+    if 0 < n_samples < len(configs):
+        configs = random.Random(seed).sample(configs, n_samples)
+    return configs
+
+
+def write_results(levels, configs, results, out_dir):
+    """Writes one row per configuration, sorted by the mean NLD."""
+    names = sorted(set(default_params) | set(configs[0]))
+    directions = ["{} from {}".format(lang_one, lang_two)
+                  for lang_one, lang_two in (levels, levels[::-1])]
+    rows = sorted(zip(configs, results), key=lambda x: np.mean(x[1][:2]))
+
+    out_file = "{}/{}-{}-sweep.csv".format(out_dir, *levels)
+    with open(out_file, 'w', encoding='utf-8') as f:
+        f.write(','.join(names + directions + ['mean', 'leaves']) + '\n')
+        for config, (nld_one, nld_two, n_leaves) in rows:
+            params = dict(default_params, **config)
+            f.write(','.join([str(params[n]) for n in names] +
+                             [str(round(x, 4))
+                              for x in (nld_one, nld_two,
+                                        (nld_one + nld_two) / 2)] +
+                             [str(n_leaves)]) + '\n')
+
+    best, (nld_one, nld_two, _) = rows[0]
+    print("Best configuration: {} ({}: {}, {}: {})"
+          .format(best, directions[0], round(nld_one, 2),
+                  directions[1], round(nld_two, 2)))
+    print("Saved the results in {}.".format(out_file))
+
+
+def _init_worker(store):
+    global _store
+    _store = store
+
+
+def _evaluate_config(config):
+    levels, ipa_dict, schema, data, test_data = _store
+    classifiers = train_trees(data, schema, levels, config)
+    average_nlds = []
+    for lang_one in levels:
+        nlds = ev.evaluate_words(lang_one, levels, test_data,
+                                 classifiers[lang_one], ipa_dict)
+        average_nlds.append(sum(nlds) / len(nlds))
+    n_leaves = sum(clf.get_n_leaves() for lang in levels
+                   for clf in classifiers[lang].values())
+    return average_nlds + [n_leaves]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE '
+                         'OUTPUT_DIR [N_SAMPLES] [N_JOBS]\n' % sys.argv[0])
+        sys.exit(1)
+    n_samples = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    n_jobs = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    sweep(sys.argv[1], sys.argv[2], sys.argv[3],
+          n_samples=n_samples, n_jobs=n_jobs)
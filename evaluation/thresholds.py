@@ -0,0 +1,113 @@
+from preprocessing import alignment_cache
+from preprocessing import utils
+from preprocessing import feature_store
+from preprocessing import feature_schema
+from preprocessing.features import simple_file_name
+from tree.tree import train_trees
+from . import evaluation as ev
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import sys
+
+default_thresholds = [0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6]
+
+# Worker state, set once per process by _init_worker.
+_store = None
+
+
+def sweep_thresholds(cognates_file, ipa_file, out_dir,
+                     thresholds=default_thresholds, train_pct=0.9,
+                     n_jobs=None, cache_file=None):
+    """
+    Compares different cognate thresholds. The word list is aligned and the
+    context features of all word pairs are extracted only once. For each
+    threshold, the cognates are determined with a binary search over the
+    sorted NLDs, the trees are trained on the first `train_pct` of the
+    cognates and evaluated (in both directions) on the remaining ones.
+
+    The results are saved in {out_dir}/{lang}-{lang}-thresholds.csv.
+
+    Keyword arguments:
+    cognates_file: a bilingual word list, as created by merge_lists
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    out_dir: the output directory
+    thresholds: the thresholds to compare (default: default_thresholds)
+    train_pct: percentage of the cognate pairs that are used for training
+               (default: 0.9)
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    """
+    levels = simple_file_name(cognates_file).split("-")[:2]
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    alignments = alignment_cache.align_word_list(cognates_file, ipa_dict,
+                                                 return_phones=True,
+                                                 cache_file=cache_file)
+    entries, ranking, distances = alignments
+    rows, offsets = feature_store.build_store(entries)
+    print("Aligned {} word pairs.".format(len(entries)))
+
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    store = (levels, ipa_dict, entries, ranking, distances,
+             rows, offsets, train_pct)
+    with Pool(n_jobs, initializer=_init_worker, initargs=(store,)) as pool:
+        results = pool.map(_evaluate_threshold, thresholds)
+
+    write_results(levels, thresholds, results, out_dir)
+
+
+def write_results(levels, thresholds, results, out_dir):
+    """Writes one row per threshold."""
+    directions = ["{} from {}".format(lang_one, lang_two)
+                  for lang_one, lang_two in (levels, levels[::-1])]
+    out_file = "{}/{}-{}-thresholds.csv".format(out_dir, *levels)
+    with open(out_file, 'w', encoding='utf-8') as f:
+        f.write(','.join(['threshold', 'cognates', 'non-cognates',
+                          'training rows', 'leaves'] + directions) + '\n')
+        for threshold, result in zip(thresholds, results):
+            f.write(','.join([str(threshold)] +
+                             [str(x) for x in result[:4]] +
+                             [str(round(x, 4)) for x in result[4:]]) + '\n')
+            print("{}: {} cognates, {} non-cognates, average NLD {} / {}"
+                  .format(threshold, result[0], result[1],
+                          *[round(x, 2) for x in result[4:]]))
+    print("Saved the results in {}.".format(out_file))
+
+
+def _init_worker(store):
+    global _store
+    _store = store
+
+
+def _evaluate_threshold(threshold):
+    (levels, ipa_dict, entries, ranking, distances,
+     rows, offsets, train_pct) = _store
+    n_cognates = int(np.searchsorted(distances, threshold, side='left'))
+    n_non_cognates = len(entries) - n_cognates
+    # indices of the cognates, in the order of the word list
+    cognate_idx = np.sort(ranking[:n_cognates])
+    n_train = round(n_cognates * train_pct)
+    if n_train == 0 or n_train == n_cognates:
+        return [n_cognates, n_non_cognates, 0, 0, float('nan'), float('nan')]
+
+    data = rows[feature_store.row_indices(offsets, cognate_idx[:n_train])]
+    classifiers = train_trees(data, feature_schema.for_levels(*levels), levels)
+    n_leaves = sum(clf.get_n_leaves() for lang in levels
+                   for clf in classifiers[lang].values())
+
+    test_data = [entries[i][1:3] for i in cognate_idx[n_train:]]
+    average_nlds = []
+    for lang_one in levels:
+        nlds = ev.evaluate_words(lang_one, levels, test_data,
+                                 classifiers[lang_one], ipa_dict)
+        average_nlds.append(sum(nlds) / len(nlds))
+    return [n_cognates, n_non_cognates, len(data), n_leaves] + average_nlds
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE OUTPUT_DIR '
+                         '[THRESHOLD ...]\n' % sys.argv[0])
+        sys.exit(1)
+    thresholds = [float(x) for x in sys.argv[4:]] or default_thresholds
+    sweep_thresholds(sys.argv[1], sys.argv[2], sys.argv[3], thresholds)
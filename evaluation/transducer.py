@@ -0,0 +1,120 @@
+from .server import Predictor
+from multiprocessing import Pool, cpu_count
+import collections
+import itertools
+import sys
+
+# Worker state, set once per process by _init_worker.
+_predictor = None
+
+
+def transduce(in_file, out_file, levels, lang_one, ipa_file, n_jobs=None,
+              chunk_size=256, multi_output=False):
+    """
+    Predicts the `lang_one` counterparts of all words of a word list of the
+    other language of `levels`, e.g. the deu words for a list of swe words.
+
+    The word list is read lazily and split into chunks of `chunk_size`
+    words that are predicted by a pool of worker processes, each of which
+    loads the classifiers only once. At most two chunks per worker are read
+    ahead, so the memory does not grow with the size of the word list. The
+    predictions are written to `out_file` (a CSV file with the columns word
+    and prediction) as soon as they are ready, in the order of the input.
+    Words containing unknown IPA symbols get an empty prediction.
+
+    Keyword arguments:
+    in_file: either a word list formatted like the ones from NorthEuraLex
+             (with a 'raw_ipa' column) or a file with one IPA word per line
+    out_file: the output file
+    levels: the languages, in the order of the columns of the word list
+            the classifiers were trained on
+    lang_one: the language whose words are predicted
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    chunk_size: the number of words per task (default: 256)
+    multi_output: use one multi-output tree per language (default: False)
+    """
+    if lang_one not in levels:
+        raise ValueError("Unknown language: {}".format(lang_one))
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    counts = [0, 0]  # words, words with unknown symbols
+    with open(in_file, 'r', encoding='utf-8') as f_in, \
+            open(out_file, 'w', encoding='utf-8') as f_out, \
+            Pool(n_jobs, initializer=_init_worker,
+                 initargs=(levels, ipa_file, multi_output)) as pool:
+        f_out.write('word,prediction\n')
+
+        def write(result):
+            chunk, predictions = result.get()
+            for word, prediction in zip(chunk, predictions):
+                f_out.write('{},{}\n'.format(word, prediction or ''))
+            counts[0] += len(chunk)
+            counts[1] += predictions.count(None)
+            f_out.flush()
+
+        # the results are written in the order of the chunks
+        pending = collections.deque()
+        for chunk in _chunks(read_words(f_in), chunk_size):
+            pending.append(pool.apply_async(_predict_chunk,
+                                            ((lang_one, chunk),)))
+            if len(pending) >= 2 * n_jobs:
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+    print("Predicted {} words ({} with unknown symbols) in {}."
+          .format(counts[0], counts[1], out_file))
+
+
+def read_words(lines):
+    """
+    Yields the IPA words of a word list, see transduce.
+    """
+    first = next(lines, None)
+    if first is None:
+        return
+    header = first.rstrip('\n').split(',')
+    if 'raw_ipa' in header:
+        ipa_index = header.index('raw_ipa')
+        lines = (line.rstrip('\n').split(',')[ipa_index] for line in lines)
+    else:
+        lines = itertools.chain([first], lines)
+    for line in lines:
+        word = line.strip()
+        if word:
+            yield word
+
+
+def _chunks(words, chunk_size):
+    words = iter(words)
+    while True:
+        chunk = list(itertools.islice(words, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(levels, ipa_file, multi_output):
+    """Loads the IPA table and the classifiers once per worker process."""
+    global _predictor
+    _predictor = Predictor(levels, ipa_file, multi_output)
+
+
+def _predict_chunk(task):
+    lang_one, chunk = task
+    responses = _predictor.answer([{'lang': lang_one, 'word': word}
+                                   for word in chunk])
+    return chunk, [response.get('prediction') for response in responses]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 7:
+        sys.stderr.write('Usage: %s LANGUAGE_1 LANGUAGE_2 TARGET_LANGUAGE '
+                         'WORD_LIST IPA_FILE OUTPUT_FILE [N_JOBS] [multi]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+    options = sys.argv[7:]
+    n_jobs = [int(option) for option in options if option.isdigit()]
+    transduce(sys.argv[4], sys.argv[6], sys.argv[1:3], sys.argv[3],
+              sys.argv[5], n_jobs[0] if n_jobs else None,
+              multi_output='multi' in options)
@@ -0,0 +1,165 @@
+from . import utils
+import hashlib
+import sqlite3
+import sys
+import time
+
+# Change this whenever the alignment or distance scores change,
+# so that old cache entries are no longer used.
+scoring_version = 1
+
+
+class AlignmentCache(object):
+    """
+    A persistent cache for aligned word pairs and their NLDs, stored in an
+    SQLite database. The entries are keyed by the two words, a hash of the
+    IPA table and the scoring version, so the same file can be shared by
+    different word lists, stages and runs. Several processes can read the
+    cache at the same time.
+
+    >>> with AlignmentCache('data/alignments.sqlite', ipa_dict) as cache:
+    ...     cognates, _ = utils.get_cognates(file, ipa_dict, cache=cache)
+    """
+
+    def __init__(self, file, ipa_dict, max_entries=None,
+                 version=scoring_version):
+        """
+        Keyword arguments:
+        file: The database file. It is created if it does not exist yet.
+        ipa_dict: A dict(str -> Phone) as created by utils.read_ipa_dict.
+        max_entries: If given, the least recently used entries are removed
+                     when the cache grows larger than this (default: None).
+        version: The scoring version (default: scoring_version).
+        """
+        self.ipa_hash = ipa_dict_hash(ipa_dict)
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(file, timeout=60)
+        # write-ahead logging allows reading while another process writes
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS alignments ('
+                          'word1 TEXT, word2 TEXT, ipa_hash TEXT, '
+                          'version INTEGER, align1 TEXT, align2 TEXT, '
+                          'nld REAL, last_used REAL, '
+                          'UNIQUE (word1, word2, ipa_hash, version))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS lru '
+                          'ON alignments (last_used)')
+        self.conn.commit()
+        self.pending = []
+        self.used = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, word1, word2):
+        """
+        Looks up the alignment of two words (strings without separators).
+
+        Returns:
+        A tuple(list(str), list(str), float) containing the aligned words
+        and their NLD, or None if the pair is not in the cache.
+        """
+        row = self.conn.execute('SELECT align1, align2, nld FROM alignments '
+                                'WHERE word1 = ? AND word2 = ? '
+                                'AND ipa_hash = ? AND version = ?',
+                                (word1, word2, self.ipa_hash,
+                                 self.version)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used.append((word1, word2))
+        return row[0].split(' '), row[1].split(' '), row[2]
+
+    def put(self, word1, word2, align1, align2, nld):
+        """
+        Adds an alignment to the cache. The entries are written when
+        flush or close is called.
+        """
+        self.pending.append((word1, word2, ' '.join(align1),
+                             ' '.join(align2), nld))
+
+    def flush(self):
+        """Writes the new entries and the access times, then evicts."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO alignments VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(w1, w2, self.ipa_hash, self.version, a1, a2, nld, now)
+                 for (w1, w2, a1, a2, nld) in self.pending])
+            self.conn.executemany(
+                'UPDATE alignments SET last_used = ? WHERE word1 = ? '
+                'AND word2 = ? AND ipa_hash = ? AND version = ?',
+                [(now, w1, w2, self.ipa_hash, self.version)
+                 for (w1, w2) in self.used])
+        self.pending = []
+        self.used = []
+        if self.max_entries is not None:
+            self.evict(self.max_entries)
+
+    def evict(self, max_entries):
+        """Removes the least recently used entries beyond `max_entries`."""
+        n_entries = len(self)
+        if n_entries <= max_entries:
+            return
+        with self.conn:
+            self.conn.execute('DELETE FROM alignments WHERE rowid IN '
+                              '(SELECT rowid FROM alignments '
+                              'ORDER BY last_used LIMIT ?)',
+                              (n_entries - max_entries,))
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM alignments') \
+                   .fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def get_cognates(file, ipa_dict, threshold=0.4, return_phones=False,
+                 cache_file=None):
+    """
+    Like utils.get_cognates, but uses the cache in `cache_file` (if given).
+    """
+    return utils.split_cognates(align_word_list(file, ipa_dict,
+                                                return_phones, cache_file),
+                                threshold)
+
+
+def align_word_list(file, ipa_dict, return_phones=False, cache_file=None):
+    """
+    Like utils.align_word_list, but uses the cache in `cache_file`
+    (if given).
+    """
+    if cache_file is None:
+        return utils.align_word_list(file, ipa_dict, return_phones)
+    with AlignmentCache(cache_file, ipa_dict) as cache:
+        return utils.align_word_list(file, ipa_dict, return_phones, cache)
+
+
+def ipa_dict_hash(ipa_dict):
+    """Returns a hash of the symbols and features of an IPA table."""
+    content = '\n'.join('{},{}'.format(symbol, ipa_dict[symbol].features())
+                        for symbol in sorted(ipa_dict))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s CACHE_FILE IPA_FILE BILINGUAL_WORD_LIST '
+                         '[BILINGUAL_WORD_LIST ...]\n' % sys.argv[0])
+        sys.exit(1)
+    ipa_dict = utils.read_ipa_dict(sys.argv[2])
+    with AlignmentCache(sys.argv[1], ipa_dict) as cache:
+        for file in sys.argv[3:]:
+            utils.align_word_list(file, ipa_dict, cache=cache)
+        cache.flush()
+        print("{} hits, {} misses, {} entries"
+              .format(cache.hits, cache.misses, len(cache)))
@@ -4,6 +4,8 @@ import numpy as np
 
 positions = ['itself', 'prev', 'prevNonDot', 'prevCons', 'prevVowel',
              'prevOrSelfNonDot', 'prevOrSelfCons', 'prevOrSelfVowel']
+# the number of columns per word
+n_word_features = len(attributes()) * len(positions)
 
 
 def get_features(source_w, target_w):
@@ -21,9 +23,8 @@ def get_features(source_w, target_w):
     and len(source_w)-1 rows. The order of the columns matches that of the
     header created by features.generate_features.
     """
-    n_features = len(attributes()) * len(positions)
-    source_matrix = process_word(source_w, n_features)
-    target_matrix = process_word(target_w, n_features)
+    source_matrix = process_word(source_w, n_word_features)
+    target_matrix = process_word(target_w, n_word_features)
 
     return np.concatenate((source_matrix, target_matrix), axis=1)
 
@@ -41,43 +42,60 @@ def process_word(word, n_features):
     """
     w_matrix = np.zeros([len(word) - 1, n_features], dtype=np.int32)
 
-    prev_sound = word[0]
-    prev_non_dot = word[0]
-    prev_cons = Phone()
-    prev_vowel = Phone()
-
+    context = initial_context(word)
     for i in range(len(word) - 1):
-        itself = word[i + 1]
+        w_matrix[i], context = context_row(word[i + 1], context)
 
-        row = (itself.features() + prev_sound.features()
-               + prev_non_dot.features() + prev_cons.features()
-               + prev_vowel.features())
+    return w_matrix
 
-        if not check_type(itself, "dot"):
-            self_non_dot = itself
-            prev_non_dot = itself
-        else:
-            self_non_dot = prev_non_dot
 
-        if check_type(itself, "consonant"):
-            self_cons = itself
-            prev_cons = itself
-        else:
-            self_cons = prev_cons
+def initial_context(word):
+    """
+    Returns the context of the first sound after the word boundary
+    word[0], see context_row.
+    """
+    return word[0], word[0], Phone(), Phone()
 
-        if check_type(itself, "vowel"):
-            self_vowel = itself
-            prev_vowel = itself
-        else:
-            self_vowel = prev_vowel
 
-        row += (self_non_dot.features() + self_cons.features()
-                + self_vowel.features())
+def context_row(itself, context):
+    """
+    Creates the features of a single sound, so that a word can be extended
+    sound by sound without processing it again.
 
-        w_matrix[i] = row
-        prev_sound = itself
+    Keyword arguments:
+    itself: The sound (a Phone).
+    context: The previous sound, non-dot sound, consonant and vowel,
+             as returned by initial_context or by the previous call.
 
-    return w_matrix
+    Returns:
+    row: A list(int) with n_phonetic_features * n_context_positions values
+         (one row of the matrix created by process_word).
+    context: The context of the next sound.
+    """
+    prev_sound, prev_non_dot, prev_cons, prev_vowel = context
+    row = (itself.features() + prev_sound.features()
+           + prev_non_dot.features() + prev_cons.features()
+           + prev_vowel.features())
+
+    if not check_type(itself, "dot"):
+        self_non_dot = itself
+    else:
+        self_non_dot = prev_non_dot
+
+    if check_type(itself, "consonant"):
+        self_cons = itself
+    else:
+        self_cons = prev_cons
+
+    if check_type(itself, "vowel"):
+        self_vowel = itself
+    else:
+        self_vowel = prev_vowel
+
+    row += (self_non_dot.features() + self_cons.features()
+            + self_vowel.features())
+
+    return row, (itself, self_non_dot, self_cons, self_vowel)
 
 
 def check_type(sound, sound_type):
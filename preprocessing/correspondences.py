@@ -0,0 +1,158 @@
+from . import alignment_cache
+from . import utils
+from .features import simple_file_name
+from multiprocessing import Pool, cpu_count
+from scipy import sparse
+import numpy as np
+import sys
+
+# The contexts the correspondences can be counted in. The context of an
+# aligned sound pair is taken from the word of the first language:
+# - 'position': whether the sound is word-initial, -medial or -final
+# - 'prev': the preceding sound ('#' at the beginning of the word)
+# - 'next': the following sound ('#' at the end of the word)
+contexts = [None, 'position', 'prev', 'next']
+positions = ['initial', 'medial', 'final']
+
+
+def correspondence_tables(files, ipa_file, out_dir, threshold=0.4,
+                          context=None, n_jobs=None, cache_file=None):
+    """
+    Counts how often the sounds of two languages are aligned in their
+    cognates, for several bilingual word lists in parallel.
+
+    For each word list, the results are saved in {out_dir}:
+    - {lang1}-{lang2}-correspondences.npz: a sparse matrix of counts
+      (scipy.sparse.save_npz) with one row per (context and) sound of the
+      first language and one column per sound of the second language
+    - {lang1}-{lang2}-correspondences-labels.csv: the labels of the rows
+      and columns
+    - {lang1}-{lang2}-correspondences.csv: all sound pairs that occur,
+      sorted by their frequency
+
+    Keyword arguments:
+    files: a list of bilingual word lists, as created by merge_lists
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    out_dir: the output directory
+    threshold: the maximum NED for cognate pairs (default: 0.4)
+    context: one of `contexts` (default: None, i.e. no context)
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    """
+    if context not in contexts:
+        raise ValueError("Unknown context: {}".format(context))
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    tasks = [(file, ipa_file, out_dir, threshold, context, cache_file)
+             for file in files]
+    with Pool(min(n_jobs, len(tasks))) as pool:
+        for out_file in pool.imap(_correspondence_table, tasks):
+            print("Saved the correspondences in {}.".format(out_file))
+
+
+def count_correspondences(cognates, context=None):
+    """
+    Counts the aligned sound pairs in a list of cognates.
+
+    Keyword arguments:
+    cognates: a list(tuple(int, list(str), list(str), float)) as returned by
+              utils.get_cognates
+    context: one of `contexts` (default: None)
+
+    Returns:
+    counts: a scipy.sparse.csr_matrix (n_row_labels x n_col_labels)
+    row_labels: a list(tuple(str, str)) containing the context (or '')
+                and the sound of the first language for each row
+    col_labels: a list(str) containing the sounds of the second language
+    """
+    words1 = [word1 for (_, word1, _, _) in cognates]
+    words2 = [word2 for (_, _, word2, _) in cognates]
+    vocab1, codes1, word_idx = _encode(words1)
+    vocab2, codes2, _ = _encode(words2)
+    # the word boundary at the beginning of each word is not counted
+    start = np.r_[True, word_idx[1:] != word_idx[:-1]]
+    end = np.r_[word_idx[1:] != word_idx[:-1], True]
+
+    if context is None:
+        context_labels = ['']
+        context_codes = np.zeros(len(codes1), dtype=np.int64)
+    elif context == 'position':
+        context_labels = positions
+        # the first sound after the word boundary is word-initial
+        initial = np.r_[False, start[:-1]]
+        context_codes = np.where(initial, 0, np.where(end, 2, 1))
+    else:
+        boundary = vocab1.index('#')
+        context_labels = vocab1
+        if context == 'prev':
+            context_codes = np.r_[boundary, codes1[:-1]]
+        else:
+            context_codes = np.where(end, boundary, np.r_[codes1[1:], 0])
+
+    keep = ~start
+    n_rows = len(context_labels) * len(vocab1)
+    rows = context_codes[keep] * len(vocab1) + codes1[keep]
+    flat = np.bincount(rows * len(vocab2) + codes2[keep],
+                       minlength=n_rows * len(vocab2))
+    counts = sparse.csr_matrix(flat.reshape(n_rows, len(vocab2)))
+    row_labels = [(c, sound) for c in context_labels for sound in vocab1]
+    return counts, row_labels, vocab2
+
+
+def write_tables(counts, row_labels, col_labels, levels, out_dir):
+    """Saves the counts as described in correspondence_tables."""
+    prefix = '{}/{}-{}-correspondences'.format(out_dir, *levels)
+    sparse.save_npz(prefix + '.npz', counts)
+    with open(prefix + '-labels.csv', 'w', encoding='utf-8') as f:
+        f.write('axis,index,context,sound\n')
+        for i, (context, sound) in enumerate(row_labels):
+            f.write('row,{},{},{}\n'.format(i, context, sound))
+        for i, sound in enumerate(col_labels):
+            f.write('column,{},,{}\n'.format(i, sound))
+
+    coo = counts.tocoo()
+    row_totals = np.asarray(counts.sum(axis=1)).ravel()
+    order = np.lexsort((coo.col, coo.row, -coo.data))
+    with open(prefix + '.csv', 'w', encoding='utf-8') as f:
+        f.write('context,{},{},count,probability\n'.format(*levels))
+        for row, col, count in zip(coo.row[order], coo.col[order],
+                                   coo.data[order]):
+            context, sound = row_labels[row]
+            # the probability of the second sound given the first (in context)
+            f.write('{},{},{},{},{}\n'.format(
+                context, sound, col_labels[col], count,
+                round(count / row_totals[row], 4)))
+    return prefix + '.csv'
+
+
+def _encode(words):
+    """
+    Returns the symbols, the symbol IDs of all sounds of all words
+    (concatenated) and the index of the word each sound belongs to.
+    """
+    vocab = sorted({symbol for word in words for symbol in word})
+    seqs, lengths = utils.encode_words(words, vocab)
+    codes = seqs[np.arange(seqs.shape[1]) < lengths[:, None]]
+    word_idx = np.repeat(np.arange(len(words)), lengths)
+    return vocab, codes, word_idx
+
+
+def _correspondence_table(task):
+    file, ipa_file, out_dir, threshold, context, cache_file = task
+    levels = simple_file_name(file).split('-')[:2]
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    cognates, _ = alignment_cache.get_cognates(file, ipa_dict, threshold,
+                                               cache_file=cache_file)
+    counts, row_labels, col_labels = count_correspondences(cognates, context)
+    return write_tables(counts, row_labels, col_labels, levels, out_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write('Usage: %s IPA_FILE OUTPUT_DIR BILINGUAL_WORD_LIST '
+                         '[BILINGUAL_WORD_LIST ...] [position | prev | next]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+    args = sys.argv[3:]
+    context = args.pop() if args[-1] in contexts else None
+    correspondence_tables(args, sys.argv[1], sys.argv[2], context=context)
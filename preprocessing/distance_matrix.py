@@ -0,0 +1,234 @@
+from . import merge_lists
+from . import utils
+from .features import simple_file_name
+from .phon_inventory import process_line
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import sys
+
+# Worker state, set once per process by _init_worker.
+_store = None
+
+
+def distance_matrix(file1, file2, ipa_file, out_dir, top_k=0, quantize=False,
+                    block_size=256, n_jobs=None):
+    """
+    Computes the NLD (utils.lev_distance) between every word of one word list
+    and every word of another one (or of the same one).
+
+    The matrix is computed in blocks of `block_size` x `block_size` word
+    pairs by a pool of worker processes. Within a block, the Levenshtein
+    matrices of all pairs are filled at once, using a precomputed table of
+    the distances between all symbols. The results are written to
+    memory-mapped .npy files in {out_dir}:
+    - {lang1}-{lang2}-words.csv: the words of the rows and columns
+    - {lang1}-{lang2}-distances.npy: the full matrix, as float32, or as
+      uint8 if `quantize` (the NLD times 255, rounded)
+    - or, if top_k > 0, {lang1}-{lang2}-neighbours.npy and
+      {lang1}-{lang2}-neighbour-distances.npy: the indices and NLDs of the
+      `top_k` nearest words of the second list for each word of the first
+      list (sorted by distance; a word is not its own neighbour)
+
+    Keyword arguments:
+    file1, file2: word lists formatted like the ones from NorthEuraLex
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    out_dir: the output directory
+    top_k: the number of nearest neighbours per word
+           (default: 0, i.e. the full matrix)
+    quantize: save the full matrix as uint8 instead of float32
+              (default: False)
+    block_size: the number of words per block (default: 256)
+    n_jobs: the number of worker processes (default: the number of CPUs)
+    """
+    lang1 = simple_file_name(file1).split('.')[0]
+    lang2 = simple_file_name(file2).split('.')[0]
+    prefix = '{}/{}-{}-'.format(out_dir, lang1, lang2)
+    words1 = read_words(file1)
+    words2 = words1 if file1 == file2 else read_words(file2)
+    with open(prefix + 'words.csv', 'w', encoding='utf-8') as f:
+        f.write('list,index,concept_id,word\n')
+        for lang, words in ((lang1, words1), (lang2, words2)):
+            for i, (concept_id, word) in enumerate(words):
+                f.write('{},{},{},{}\n'.format(lang, i, concept_id, word))
+
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    vocab, seqs1, lengths1, seqs2, lengths2 = encode([w for _, w in words1],
+                                                     [w for _, w in words2])
+    sym_dist = symbol_distances(vocab, ipa_dict)
+    blocks1 = range(0, len(words1), block_size)
+    blocks2 = range(0, len(words2), block_size)
+    symmetric = file1 == file2
+
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    store = (sym_dist, seqs1, lengths1, seqs2, lengths2, block_size,
+             symmetric)
+
+    if top_k > 0:
+        top_k = min(top_k, len(words2) - symmetric)
+        with Pool(n_jobs, initializer=_init_worker,
+                  initargs=(store,)) as pool:
+            results = pool.imap(_nearest_neighbours,
+                                [(start, top_k) for start in blocks1])
+            neighbours = np.lib.format.open_memmap(
+                prefix + 'neighbours.npy', mode='w+', dtype=np.int32,
+                shape=(len(words1), top_k))
+            distances = np.lib.format.open_memmap(
+                prefix + 'neighbour-distances.npy', mode='w+',
+                dtype=np.float32, shape=(len(words1), top_k))
+            for start, (idx, dist) in zip(blocks1, results):
+                neighbours[start:start + block_size] = idx
+                distances[start:start + block_size] = dist
+            neighbours.flush()
+            distances.flush()
+        print("Saved the {} nearest neighbours of {} words in {}."
+              .format(top_k, len(words1), prefix + 'neighbours.npy'))
+        return
+
+    out_file = prefix + 'distances.npy'
+    matrix = np.lib.format.open_memmap(
+        out_file, mode='w+', dtype=np.uint8 if quantize else np.float32,
+        shape=(len(words1), len(words2)))
+    del matrix
+    # for a single list, only the blocks above the diagonal are computed
+    tasks = [(start1, start2, out_file, quantize)
+             for start1 in blocks1 for start2 in blocks2
+             if not symmetric or start2 >= start1]
+    with Pool(n_jobs, initializer=_init_worker, initargs=(store,)) as pool:
+        for _ in pool.imap_unordered(_write_block, tasks):
+            pass
+    print("Saved the {} x {} distance matrix in {}."
+          .format(len(words1), len(words2), out_file))
+
+
+def read_words(file):
+    """
+    Returns a list(tuple(int, str)) containing the concept IDs and the words
+    (without separators) of a word list.
+    """
+    return [(concept + 1, utils.clean_word(word))
+            for concept, words in enumerate(merge_lists.read_file(file))
+            for word in words]
+
+
+def encode(words1, words2):
+    """
+    Transforms two lists of words into padded matrices of symbol IDs.
+
+    Returns:
+    vocab: a list(str) of all symbols
+    seqs1, seqs2: numpy matrices (n_words x max_length) of symbol IDs
+    lengths1, lengths2: numpy arrays containing the lengths of the words
+    """
+    words1 = [process_line(word) for word in words1]
+    words2 = [process_line(word) for word in words2]
+    vocab = sorted({symbol for word in words1 + words2 for symbol in word})
+    return ([vocab] + list(utils.encode_words(words1, vocab)) +
+            list(utils.encode_words(words2, vocab)))
+
+
+def symbol_distances(vocab, ipa_dict):
+    """Returns the matrix of the phonetic distances between all symbols."""
+    phones = [utils.to_phone(symbol, ipa_dict) for symbol in vocab]
+    return np.array([[p1.distance(p2) for p2 in phones] for p1 in phones])
+
+
+def block_distances(sym_dist, seqs1, lengths1, seqs2, lengths2):
+    """
+    Computes the NLDs between all words of two blocks, like
+    utils.lev_distance: substitutions cost the phonetic distance,
+    insertions and deletions cost 1, and the distance is divided by the
+    length of the longer word.
+
+    Returns:
+    A numpy matrix (len(seqs1) x len(seqs2)).
+    """
+    n1, l1 = seqs1.shape
+    n2, l2 = seqs2.shape
+    result = np.zeros((n1, n2))
+    prev = np.broadcast_to(np.arange(l2 + 1, dtype=float),
+                           (n1, n2, l2 + 1)).copy()
+    cols = np.arange(n2)
+    for i in range(1, l1 + 1):
+        substitution = sym_dist[seqs1[:, i - 1][:, None, None],
+                                seqs2[None, :, :]]
+        cur = np.empty_like(prev)
+        cur[:, :, 0] = i
+        for j in range(1, l2 + 1):
+            cur[:, :, j] = np.minimum(
+                np.minimum(prev[:, :, j], cur[:, :, j - 1]) + 1,
+                prev[:, :, j - 1] + substitution[:, :, j - 1])
+        done = lengths1 == i
+        if done.any():
+            result[done] = cur[done][:, cols, lengths2]
+        prev = cur
+
+    longest = np.maximum(lengths1[:, None], lengths2[None, :])
+    # lev_distance returns the length of the other word if one is empty
+    empty = (lengths1[:, None] == 0) | (lengths2[None, :] == 0)
+    return np.where(empty, longest, result / np.maximum(longest, 1))
+
+
+def _init_worker(store):
+    global _store
+    _store = store
+
+
+def _block(start1, start2):
+    sym_dist, seqs1, lengths1, seqs2, lengths2, block_size, _ = _store
+    block1 = slice(start1, start1 + block_size)
+    block2 = slice(start2, start2 + block_size)
+    len1 = lengths1[block1]
+    len2 = lengths2[block2]
+    return block_distances(sym_dist,
+                           seqs1[block1, :max(len1.max(), 1)], len1,
+                           seqs2[block2, :max(len2.max(), 1)], len2)
+
+
+def _write_block(task):
+    start1, start2, out_file, quantize = task
+    symmetric = _store[-1]
+    dist = _block(start1, start2)
+    if quantize:
+        # distances above 1 (e.g. to an empty word) saturate at 255
+        dist = np.round(np.clip(dist, 0, 1) * 255).astype(np.uint8)
+    matrix = np.load(out_file, mmap_mode='r+')
+    matrix[start1:start1 + len(dist), start2:start2 + dist.shape[1]] = dist
+    if symmetric and start1 != start2:
+        matrix[start2:start2 + dist.shape[1], start1:start1 + len(dist)] = \
+            dist.T
+    matrix.flush()
+
+
+def _nearest_neighbours(task):
+    start1, top_k = task
+    _, _, lengths1, _, lengths2, block_size, symmetric = _store
+    n1 = len(lengths1[start1:start1 + block_size])
+    best_idx = np.zeros((n1, 0), dtype=np.int64)
+    best_dist = np.zeros((n1, 0))
+    for start2 in range(0, len(lengths2), block_size):
+        dist = _block(start1, start2)
+        idx = np.broadcast_to(np.arange(start2, start2 + dist.shape[1]),
+                              dist.shape)
+        if symmetric:
+            dist = np.where(idx == np.arange(start1, start1 + n1)[:, None],
+                            np.inf, dist)
+        dist = np.hstack([best_dist, dist])
+        idx = np.hstack([best_idx, idx])
+        keep = np.argpartition(dist, min(top_k, dist.shape[1] - 1),
+                               axis=1)[:, :top_k]
+        best_dist = np.take_along_axis(dist, keep, axis=1)
+        best_idx = np.take_along_axis(idx, keep, axis=1)
+    order = np.argsort(best_dist, axis=1, kind='stable')
+    return (np.take_along_axis(best_idx, order, axis=1),
+            np.take_along_axis(best_dist, order, axis=1))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        sys.stderr.write('Usage: %s WORDLIST_1 WORDLIST_2 IPA_FILE '
+                         'OUTPUT_DIR [TOP_K] [uint8]\n' % sys.argv[0])
+        sys.exit(1)
+    distance_matrix(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4],
+                    top_k=int(sys.argv[5]) if len(sys.argv) > 5 else 0,
+                    quantize=len(sys.argv) > 6 and sys.argv[6] == 'uint8')
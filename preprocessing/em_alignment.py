@@ -0,0 +1,283 @@
+from .phon_inventory import process_line
+from . import utils
+from scipy import sparse
+import numpy as np
+import sys
+
+# trace codes of the batched Needleman-Wunsch algorithm
+DIAG, TOP, LEFT = 0, 1, 2
+gap_score = -1
+
+
+def align_word_list(file, ipa_dict, return_phones=False, threshold=0.4,
+                    max_iter=50, prior_weight=0.5, batch_size=4096,
+                    verbose=False):
+    """
+    Like utils.align_word_list, but the substitution scores are learned from
+    the data (cf. Wettig et al. 2012). The word pairs are first aligned with
+    the scores of utils.needleman_wunsch. Then the following steps are
+    repeated until no alignment of a (potential) cognate changes any more:
+    - count how often each pair of sounds is aligned in the cognates,
+    - turn the counts into PMI scores and mix them with the initial scores,
+    - realign all cognates.
+    The cognates are the pairs with an NLD below `threshold` after the
+    initial alignment. All pairs are aligned at once (in batches of
+    `batch_size`), so that each iteration only takes a few numpy operations
+    per cell of the alignment matrix.
+
+    Keyword arguments:
+    file: a bilingual word list, as created by merge_lists
+    ipa_dict: a dict(str -> Phone) as created by utils.read_ipa_dict
+    return_phones: if True, return [Phone] else [str] (default: False)
+    threshold: the maximum NED for the pairs the scores are learned from
+               (default: 0.4)
+    max_iter: the maximum number of iterations (default: 50)
+    prior_weight: the weight of the initial scores, between 0 and 1
+                  (default: 0.5)
+    batch_size: the number of word pairs aligned at once (default: 4096)
+    verbose: print the number of changed alignments per iteration
+
+    Returns:
+    The same as utils.align_word_list.
+    """
+    with open(file, 'r', encoding='utf-8') as f:
+        content = f.readlines()[1:]
+    concept_ids, words1, words2 = [], [], []
+    for line in content:
+        concept_id, word1, word2 = utils.parse_line(line)
+        concept_ids.append(concept_id)
+        words1.append(process_line(word1))
+        words2.append(process_line(word2))
+
+    vocab1, seqs1, lengths1 = encode(words1)
+    vocab2, seqs2, lengths2 = encode(words2)
+    prior = initial_scores(vocab1, vocab2, ipa_dict)
+
+    paths = align_batch(seqs1, lengths1, seqs2, lengths2, prior, batch_size)
+    distances = np.array([utils.lev_distance(a1, a2, ipa_dict)
+                          for a1, a2 in decode(paths, seqs1, seqs2,
+                                               vocab1, vocab2)])
+    cognates = np.flatnonzero(distances < threshold)
+    initial_paths = paths.copy()
+
+    scores = prior
+    for iteration in range(max_iter):
+        counts = count_pairs(paths[cognates], seqs1[cognates],
+                             seqs2[cognates], (len(vocab1), len(vocab2)))
+        scores = (prior_weight * prior +
+                  (1 - prior_weight) * pmi_scores(counts))
+        new_paths = align_batch(seqs1[cognates], lengths1[cognates],
+                                seqs2[cognates], lengths2[cognates],
+                                scores, batch_size)
+        n_changed = int(np.sum(np.any(new_paths != paths[cognates], axis=1)))
+        paths[cognates] = new_paths
+        if verbose:
+            print("Iteration {}: {} changed alignments"
+                  .format(iteration + 1, n_changed))
+        if n_changed == 0:
+            break
+
+    entries = []
+    # only the NLDs of realigned pairs need to be recomputed
+    changed = np.any(paths != initial_paths, axis=1)
+    aligned = decode(paths, seqs1, seqs2, vocab1, vocab2)
+    for w, (concept_id, (align1, align2)) in enumerate(zip(concept_ids,
+                                                           aligned)):
+        if changed[w]:
+            distances[w] = utils.lev_distance(align1, align2, ipa_dict)
+        ld = float(distances[w])
+        if return_phones:
+            align1 = [utils.to_phone(sound, ipa_dict) for sound in align1]
+            align2 = [utils.to_phone(sound, ipa_dict) for sound in align2]
+        entries.append((concept_id, align1, align2, round(ld, 2)))
+
+    ranking = np.argsort(distances, kind='stable')
+    return entries, ranking, distances[ranking]
+
+
+def get_cognates(file, ipa_dict, threshold=0.4, return_phones=False,
+                 **kwargs):
+    """
+    Like utils.get_cognates, but with learned alignment scores. The keyword
+    arguments are passed on to align_word_list.
+    """
+    return utils.split_cognates(align_word_list(file, ipa_dict, return_phones,
+                                                threshold, **kwargs),
+                                threshold)
+
+
+def encode(words):
+    """
+    Transforms words (lists of symbols) into a padded integer matrix.
+
+    Returns:
+    vocab: a list(str) of the symbols, where vocab[0] is the gap '*'
+    seqs: a numpy matrix (n_words x max_length) of symbol IDs
+    lengths: a numpy array containing the length of each word
+    """
+    vocab = ['*'] + sorted({symbol for word in words for symbol in word})
+    seqs, lengths = utils.encode_words(words, vocab)
+    return vocab, seqs, lengths
+
+
+def initial_scores(vocab1, vocab2, ipa_dict):
+    """
+    Returns the substitution scores used by utils.needleman_wunsch:
+    2 - distance for phones with a distance below 0.5, else -1.
+    """
+    phones1 = [utils.to_phone(symbol, ipa_dict) for symbol in vocab1]
+    phones2 = [utils.to_phone(symbol, ipa_dict) for symbol in vocab2]
+    dist = np.array([[p1.distance(p2) for p2 in phones2] for p1 in phones1])
+    return np.where(dist < 0.5, 2 - dist, -1.0)
+
+
+def count_pairs(paths, seqs1, seqs2, shape):
+    """
+    Counts how often each pair of symbols is aligned (including gaps).
+
+    Returns:
+    A scipy.sparse.csr_matrix of the given shape.
+    """
+    ids1, ids2 = path_symbols(paths, seqs1, seqs2)
+    valid = paths >= 0
+    return sparse.coo_matrix((np.ones(valid.sum()),
+                              (ids1[valid], ids2[valid])),
+                             shape=shape).tocsr()
+
+
+def pmi_scores(counts, smoothing=0.1):
+    """
+    Computes the (smoothed) pointwise mutual information of the aligned
+    symbol pairs: log(p(a, b) / (p(a) * p(b))).
+    """
+    joint = counts.toarray() + smoothing
+    joint /= joint.sum()
+    return np.log(joint / (joint.sum(axis=1, keepdims=True) *
+                           joint.sum(axis=0, keepdims=True)))
+
+
+def align_batch(seqs1, lengths1, seqs2, lengths2, scores, batch_size=4096):
+    """
+    Aligns many word pairs at once with the Needleman-Wunsch algorithm.
+    The pairs are sorted by length and processed in batches, and each cell
+    of the alignment matrix is computed for a whole batch at once.
+    Ties are broken like in utils.needleman_wunsch.
+
+    Returns:
+    A numpy matrix containing a trace code (DIAG, TOP or LEFT) per step of
+    each alignment, from the end of the words to their beginning, padded
+    with -1.
+    """
+    n_pairs = len(seqs1)
+    max_steps = seqs1.shape[1] + seqs2.shape[1]
+    paths = np.full((n_pairs, max_steps), -1, dtype=np.int8)
+    order = np.argsort(np.maximum(lengths1, lengths2), kind='stable')
+    for start in range(0, n_pairs, batch_size):
+        batch = order[start:start + batch_size]
+        len1 = lengths1[batch]
+        len2 = lengths2[batch]
+        l1 = max(len1.max(initial=0), 1)
+        l2 = max(len2.max(initial=0), 1)
+        trace = _fill(seqs1[batch, :l1], seqs2[batch, :l2],
+                      len1 > len2, scores)
+        paths[batch, :l1 + l2] = _traceback(trace, len1, len2)
+    return paths
+
+
+def _fill(seqs1, seqs2, swapped, scores):
+    """Fills the trace matrices of a batch of word pairs."""
+    n_pairs, l1 = seqs1.shape
+    l2 = seqs2.shape[1]
+    score = np.zeros((n_pairs, l1 + 1, l2 + 1))
+    score[:, :, 0] = np.arange(l1 + 1) * gap_score
+    score[:, 0, :] = np.arange(l2 + 1) * gap_score
+    trace = np.full((n_pairs, l1 + 1, l2 + 1), DIAG, dtype=np.int8)
+    trace[:, 1:, 0] = TOP
+    trace[:, 0, 1:] = LEFT
+    # utils.needleman_wunsch aligns the shorter word against the longer
+    # one and prefers TOP over LEFT, which is LEFT over TOP for us if the
+    # first word is longer
+    first_gap = np.where(swapped, LEFT, TOP)
+    second_gap = np.where(swapped, TOP, LEFT)
+
+    for i in range(1, l1 + 1):
+        substitution = scores[seqs1[:, i - 1:i], seqs2]
+        for j in range(1, l2 + 1):
+            diag = score[:, i - 1, j - 1] + substitution[:, j - 1]
+            top = score[:, i - 1, j] + gap_score
+            left = score[:, i, j - 1] + gap_score
+            best = np.maximum(np.maximum(diag, top), left)
+            gaps = np.where(swapped, left, top)
+            score[:, i, j] = best
+            trace[:, i, j] = np.where(
+                np.abs(best - diag) < 1e-7, DIAG,
+                np.where(np.abs(best - gaps) < 1e-7, first_gap, second_gap))
+    return trace
+
+
+def _traceback(trace, len1, len2):
+    """Follows the traces of a batch from the last cell to the first."""
+    n_pairs = len(trace)
+    pairs = np.arange(n_pairs)
+    i = len1.copy()
+    j = len2.copy()
+    steps = np.full((n_pairs, trace.shape[1] + trace.shape[2] - 2), -1,
+                    dtype=np.int8)
+    for step in range(steps.shape[1]):
+        active = (i > 0) | (j > 0)
+        if not active.any():
+            break
+        current = trace[pairs, i, j]
+        steps[active, step] = current[active]
+        i = i - (active & (current != LEFT))
+        j = j - (active & (current != TOP))
+    return steps
+
+
+def path_symbols(paths, seqs1, seqs2):
+    """
+    Returns the symbol IDs (0 for gaps) of both words at each step of the
+    alignment paths (see align_batch).
+    """
+    consume1 = (paths == DIAG) | (paths == TOP)
+    consume2 = (paths == DIAG) | (paths == LEFT)
+    # the steps go backwards, so the positions are counted from the end
+    pos1 = (consume1.sum(axis=1, keepdims=True) -
+            np.cumsum(consume1, axis=1))
+    pos2 = (consume2.sum(axis=1, keepdims=True) -
+            np.cumsum(consume2, axis=1))
+    rows = np.arange(len(paths))[:, None]
+    pos1 = np.clip(pos1, 0, seqs1.shape[1] - 1)
+    pos2 = np.clip(pos2, 0, seqs2.shape[1] - 1)
+    ids1 = np.where(consume1, seqs1[rows, pos1], 0)
+    ids2 = np.where(consume2, seqs2[rows, pos2], 0)
+    return ids1, ids2
+
+
+def decode(paths, seqs1, seqs2, vocab1, vocab2):
+    """
+    Returns the aligned words, as lists of symbols starting with '#'
+    like the ones created by utils.needleman_wunsch.
+    """
+    ids1, ids2 = path_symbols(paths, seqs1, seqs2)
+    aligned = []
+    for path, word1, word2 in zip(paths, ids1, ids2):
+        n_steps = np.sum(path >= 0)
+        aligned.append((['#'] + [vocab1[s] for s in word1[:n_steps][::-1]],
+                        ['#'] + [vocab2[s] for s in word2[:n_steps][::-1]]))
+    return aligned
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE '
+                         '[THRESHOLD] [MAX_ITER]\n' % sys.argv[0])
+        sys.exit(1)
+    ipa_dict = utils.read_ipa_dict(sys.argv[2])
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.4
+    max_iter = int(sys.argv[4]) if len(sys.argv) > 4 else 50
+    cognates, _ = get_cognates(sys.argv[1], ipa_dict, threshold,
+                               max_iter=max_iter, verbose=True)
+    print("{} cognates".format(len(cognates)))
+    for cognate in cognates[:10]:
+        print(cognate)
@@ -0,0 +1,158 @@
+from . import transform_ipa as tipa
+from .features import header_list
+import numpy as np
+import copy
+import functools
+import pickle
+import re
+
+
+class FeatureSchema(object):
+    """
+    Describes the columns of a feature matrix, as created by
+    features.generate_features, and which of them are used for predicting
+    each phonetic feature. The column indices are computed once, so that
+    training and prediction use exactly the same columns.
+
+    >>> schema = for_levels('deu', 'swe')
+    >>> data_cols, label_col = schema.data_columns('deu_itself_manner')
+    """
+
+    def __init__(self, header):
+        """
+        Keyword arguments:
+        header: A list(str) containing the column names, as created by
+                features.header_list.
+        """
+        self.header = list(header)
+        self.index = {name: i for i, name in enumerate(self.header)}
+        self.languages = []
+        for name in self.header:
+            lang = name.split('_')[0]
+            if lang not in self.languages:
+                self.languages.append(lang)
+
+        # Exclude certain information from the training data:
+        # - the column that we want to predict
+        # - columns about features that are too similar to it
+        #   (prevOrSelfNonDot, prevOrSelfConsonant, prevOrSelfVowel
+        #    for the language level we are currently considering)
+        self.excluded = {}
+        # the training columns left out by `reduced`, per language
+        self.dropped = {}
+        self._data_cols = {}
+        for lang in self.languages:
+            self.excluded[lang] = frozenset(
+                i for i, name in enumerate(self.header)
+                if name.startswith(lang + '_itself') or
+                name.startswith(lang + '_prevOrSelf'))
+            for feature in self.label_names(lang):
+                if feature in self.index:
+                    self.data_columns(feature)
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureSchema) and self.header == other.header
+
+    def __ne__(self, other):
+        return not self == other
+
+    def label_names(self, lang):
+        """Returns the names of the label columns of a language."""
+        return ["{}_itself_{}".format(lang, feature_name)
+                for feature_name in tipa.phonetic_features[1:]]
+
+    def label_columns(self, lang):
+        """
+        Returns the indices of the label columns of a language, in the order
+        of transform_ipa.phonetic_features[1:].
+        """
+        return np.array([self.index[feature]
+                         for feature in self.label_names(lang)],
+                        dtype=np.int64)
+
+    def data_columns(self, feature):
+        """
+        Determines which columns of the feature matrix are used for
+        predicting the given feature.
+
+        Keyword arguments:
+        feature: The column to predict, e.g. 'deu_itself_manner'.
+
+        Returns:
+        data_cols: A numpy array containing the indices of the training
+                   columns.
+        label_col: The index of the label column.
+        """
+        label_col = self.index[feature]
+        if feature not in self._data_cols:
+            excluded = self.excluded[feature.split('_')[0]] | {label_col}
+            self._data_cols[feature] = np.array(
+                [i for i in range(len(self.header)) if i not in excluded],
+                dtype=np.int64)
+        return self._data_cols[feature], label_col
+
+    def reduced(self, matrix):
+        """
+        Returns a copy of the schema without the training columns that are
+        constant in `matrix` or identical to an earlier training column
+        (for each language, the training columns are the same for all of its
+        phonetic features). The left out columns are recorded in
+        `dropped[lang]`, a dict mapping each of them to the index of the
+        identical column that is kept, or to None if it is constant.
+
+        Keyword arguments:
+        matrix: A numpy matrix with the columns described by `header`.
+        """
+        schema = copy.deepcopy(self)
+        if len(matrix) == 0:
+            return schema
+        for lang in self.languages:
+            label_features = [feature for feature in self.label_names(lang)
+                              if feature in self.index]
+            if not label_features:
+                continue
+            cols, _ = self.data_columns(label_features[0])
+            columns = np.ascontiguousarray(matrix[:, cols].T)
+            constant = np.all(columns == columns[:, :1], axis=1)
+            # view each column as a single value to find identical columns
+            packed = columns.view(np.dtype((np.void, columns.dtype.itemsize *
+                                            columns.shape[1]))).ravel()
+            _, first, inverse = np.unique(packed, return_index=True,
+                                          return_inverse=True)
+            identical = cols[first[inverse.ravel()]]
+            schema.dropped[lang] = {
+                int(col): None if is_constant else int(same)
+                for col, same, is_constant in zip(cols, identical, constant)
+                if is_constant or same != col}
+            kept = np.array([col for col in cols
+                             if col not in schema.dropped[lang]],
+                            dtype=np.int64)
+            for feature in label_features:
+                schema._data_cols[feature] = kept
+        return schema
+
+    def feature_names(self, feature):
+        """Returns the names of the training columns for a feature."""
+        return [self.header[i] for i in self.data_columns(feature)[0]]
+
+    def save(self, file):
+        with open(file, 'wb') as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load(file):
+    """Loads a FeatureSchema saved with FeatureSchema.save."""
+    with open(file, 'rb') as handle:
+        return pickle.load(handle)
+
+
+def from_file(features_file):
+    """Creates the FeatureSchema of a feature file from its header row."""
+    with open(features_file, 'r', encoding='utf-8') as f:
+        return FeatureSchema(re.sub('[# \\n]', '', f.readline()).split(','))
+
+
+@functools.lru_cache()
+def for_levels(*levels):
+    """Returns the FeatureSchema of the feature matrices for the languages."""
+    return FeatureSchema(header_list(list(levels)))
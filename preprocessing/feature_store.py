@@ -0,0 +1,51 @@
+from . import candidate_contexts
+import numpy as np
+
+
+def build_store(cognates):
+    """
+    Extracts the context features for every cognate pair once and stores
+    them in a single matrix.
+
+    Keyword arguments:
+    cognates: A list(tuple(int, list(Phone), list(Phone), float))
+              as returned by utils.get_cognates(return_phones=True).
+
+    Returns:
+    rows: A numpy matrix containing the feature rows of all pairs,
+          in the order of `cognates`.
+    offsets: A numpy array of length len(cognates) + 1 where the rows of
+             pair i are rows[offsets[i]:offsets[i + 1]].
+    """
+    matrices = [candidate_contexts.get_features(src_word, target_word)
+                for (_, src_word, target_word, _) in cognates]
+    offsets = np.zeros(len(matrices) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(m) for m in matrices])
+    return np.vstack(matrices), offsets
+
+
+def row_indices(offsets, pair_indices):
+    """
+    Returns the indices of the feature rows that belong to the given pairs,
+    in the order of `pair_indices`.
+
+    >>> row_indices(np.array([0, 3, 5, 9]), [2, 0])
+    array([5, 6, 7, 8, 0, 1, 2])
+    """
+    pair_indices = np.asarray(pair_indices, dtype=np.int64)
+    starts = offsets[pair_indices]
+    return segment_indices(starts, offsets[pair_indices + 1] - starts)
+
+
+def segment_indices(starts, lengths):
+    """
+    Returns the indices of the rows in the segments
+    [starts[i], starts[i] + lengths[i]), one segment after the other.
+
+    >>> segment_indices(np.array([5, 0]), np.array([2, 3]))
+    array([5, 6, 0, 1, 2])
+    """
+    # position of each row within its own segment
+    within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths,
+                                                  lengths)
+    return np.repeat(starts, lengths) + within
@@ -1,4 +1,7 @@
+from . import alignment_cache
 from . import candidate_contexts
+from . import em_alignment
+from . import feature_store
 from . import transform_ipa as tipa
 from . import utils
 import numpy as np
@@ -6,7 +9,8 @@ import sys
 import re
 
 
-def generate_features(in_file, ipa_file, threshold=0.4, train_pct=1):
+def generate_features(in_file, ipa_file, threshold=0.4, train_pct=1,
+                      cache_file=None, refine=False):
     """
     Generates a CSV file containing the (integer) features needed for creating
     a decision tree.
@@ -16,21 +20,25 @@ def generate_features(in_file, ipa_file, threshold=0.4, train_pct=1):
     ipa_file: the CSV file created by transform_ipa.transform_ipa
     threshold: the maximum NED for cognate pairs (default: 0.4)
     train_pct: percentage of the cognate pairs that are used for training
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    refine: if True, the alignment scores are learned from the word list
+            with em_alignment (the cache is not used then; default: False)
     """
     ipa_dict = utils.read_ipa_dict(ipa_file)
-    cognates, _ = utils.get_cognates(in_file,
-                                     ipa_dict,
-                                     threshold,
-                                     return_phones=True)
+    if refine:
+        cognates, _ = em_alignment.get_cognates(in_file, ipa_dict, threshold,
+                                                return_phones=True)
+    else:
+        cognates, _ = alignment_cache.get_cognates(in_file,
+                                                   ipa_dict,
+                                                   threshold,
+                                                   return_phones=True,
+                                                   cache_file=cache_file)
     total_data_pct = len(cognates)
     train_data_pct = round(total_data_pct * train_pct)
     print(train_data_pct)
     cognates = cognates[:train_data_pct]
-    all_features = []
-    for (_, src_word, target_word, _) in cognates:
-        features = candidate_contexts.get_features(src_word, target_word)
-        all_features.append(features)
-    all_features = np.vstack(all_features)
+    all_features, _ = feature_store.build_store(cognates)
     print("Extracted the features for {} out of {} words."
           .format(train_data_pct, total_data_pct))
 
@@ -67,9 +75,13 @@ def simple_file_name(file):
 if __name__ == "__main__":
     if len(sys.argv) < 5:
         sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE ' +
-                         'THRESHOLD TRAIN_DATA_PERCENTAGE\n'
+                         'THRESHOLD TRAIN_DATA_PERCENTAGE '
+                         '[ALIGNMENT_CACHE | em]\n'
                          .format(sys.argv[0]))
         sys.exit(1)
 
+    option = sys.argv[5] if len(sys.argv) > 5 else None
     generate_features(sys.argv[1], sys.argv[2],
-                      float(sys.argv[3]), float(sys.argv[4]))
+                      float(sys.argv[3]), float(sys.argv[4]),
+                      None if option == 'em' else option,
+                      refine=option == 'em')
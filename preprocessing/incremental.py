@@ -0,0 +1,171 @@
+from . import alignment_cache
+from . import candidate_contexts
+from . import feature_schema
+from . import feature_store
+from . import merge_lists
+from . import utils
+import numpy as np
+import hashlib
+import os
+import pickle
+
+
+def update(lang1, file1, lang2, file2, ipa_file, data_dir, threshold=0.4,
+           train_pct=0.9, build=None, tree_kind=None):
+    """
+    Brings the bilingual word list, the lists of cognates and non-cognates
+    (see utils.print_cognates), the feature file and the trees of a
+    language pair up to date after the monolingual word lists have changed.
+    The trees are built by the function `build` (see tree.incremental).
+
+    The alignments and feature rows of all word pairs are kept in
+    {data_dir}/{lang1}-{lang2}-store.pickle. Only word pairs that are not in
+    the store yet (new concepts or changed IPA transcriptions) are aligned,
+    and only their features are extracted; pairs that no longer occur in the
+    word lists are dropped. The feature file is the same as the one created
+    by features.generate_features, and the trees are only rebuilt if the
+    training data or the kind of trees has changed since they were last
+    built.
+
+    Keyword arguments:
+    lang1, file1: the name and the word list of the first language
+    lang2, file2: the name and the word list of the second language
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    data_dir: the directory of the bilingual word list, features and store
+    threshold: the maximum NED for cognate pairs (default: 0.4)
+    train_pct: percentage of the cognate pairs that are used for training
+               (default: 0.9)
+    build: a function that builds the trees from the feature file, called
+           with the name of the file (default: None, i.e. only the word
+           lists and features are updated)
+    tree_kind: a picklable description of the trees `build` creates, e.g.
+               its options (default: None)
+
+    Returns:
+    True if the trees were rebuilt.
+    """
+    ipa_dict = utils.read_ipa_dict(ipa_file)
+    prefix = '{}/{}-{}-'.format(data_dir, lang1, lang2)
+    store_file = prefix + 'store.pickle'
+    merge_lists.print_file(lang1, lang2, merge_lists.read_file(file1),
+                           merge_lists.read_file(file2), data_dir)
+    with open(prefix + 'all.csv', 'r', encoding='utf-8') as f:
+        keys = [utils.parse_line(line) for line in f.readlines()[1:]]
+
+    schema = feature_schema.for_levels(lang1, lang2)
+    store = load_store(store_file, alignment_cache.ipa_dict_hash(ipa_dict),
+                       schema)
+    store, n_new = update_store(store, keys, ipa_dict)
+    print("{} new or changed word pairs, {} unchanged."
+          .format(n_new, len(keys) - n_new))
+    write_cognates(prefix + 'all.csv', store, threshold)
+
+    # the same selection of cognates as in features.generate_features
+    cognate_idx = np.flatnonzero(store['distances'] < threshold)
+    cognate_idx = cognate_idx[:round(len(cognate_idx) * train_pct)]
+    train_rows = store['rows'][feature_store.row_indices(store['offsets'],
+                                                         cognate_idx)]
+
+    features_file = prefix + 'features.csv'
+    features_hash = hashlib.sha1(train_rows.tobytes()).hexdigest()
+    changed = (features_hash != store.get('features_hash') or
+               tree_kind != store.get('tree_kind') or
+               not os.path.exists(features_file))
+    if changed:
+        np.savetxt(features_file, train_rows, fmt='%d', delimiter=',',
+                   header=','.join(schema.header), comments='')
+        print("Saved the features of {} cognates in {}."
+              .format(len(cognate_idx), features_file))
+    else:
+        print("The training data and the kind of trees have not changed.")
+    # the store records the training data of the last trees that were built
+    changed = changed and build is not None
+    if changed:
+        build(features_file)
+        store['features_hash'] = features_hash
+        store['tree_kind'] = tree_kind
+
+    with open(store_file, 'wb') as handle:
+        pickle.dump(store, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    return changed
+
+
+def write_cognates(file, store, threshold):
+    """
+    Saves the cognates and non-cognates of the word list `file` like
+    utils.print_cognates, using the stored alignments.
+    """
+    entries = [(concept_id, align1, align2, round(float(ld), 2))
+               for (concept_id, _, _), (align1, align2), ld
+               in zip(store['keys'], store['alignments'], store['distances'])]
+    ranking = np.argsort(store['distances'], kind='stable')
+    utils.write_cognates(file, *utils.split_cognates(
+        (entries, ranking, store['distances'][ranking]), threshold))
+
+
+def load_store(store_file, ipa_hash, schema):
+    """
+    Loads the stored alignments and features, or returns an empty store
+    if there is none for the given IPA table and feature schema.
+    """
+    if os.path.exists(store_file):
+        with open(store_file, 'rb') as handle:
+            store = pickle.load(handle)
+        if store['ipa_hash'] == ipa_hash and store.get('schema') == schema:
+            return store
+        print("The IPA table or the features have changed, "
+              "rebuilding the store.")
+    return {'ipa_hash': ipa_hash, 'schema': schema, 'keys': [],
+            'alignments': [], 'distances': np.zeros(0),
+            'rows': np.zeros((0, len(schema.header)), dtype=int),
+            'offsets': np.zeros(1, dtype=np.int64)}
+
+
+def update_store(store, keys, ipa_dict):
+    """
+    Replaces the entries of the store by the given word pairs (in this
+    order), aligning only the pairs that are not in the store yet.
+    The feature rows of the new pairs are appended to the stored rows,
+    which are then put into the order of the word list.
+
+    Keyword arguments:
+    store: a dict as returned by load_store
+    keys: a list(tuple(int, str, str)) of the word pairs, as returned by
+          utils.parse_line
+
+    Returns:
+    The updated store and the number of new word pairs.
+    """
+    old_idx = {key: i for i, key in enumerate(store['keys'])}
+    alignments, distances, new_matrices = [], [], []
+    starts = np.zeros(len(keys), dtype=np.int64)
+    lengths = np.zeros(len(keys), dtype=np.int64)
+    n_rows = len(store['rows'])
+    for k, (concept_id, word1, word2) in enumerate(keys):
+        i = old_idx.get((concept_id, word1, word2))
+        if i is not None:
+            alignments.append(store['alignments'][i])
+            distances.append(store['distances'][i])
+            starts[k] = store['offsets'][i]
+            lengths[k] = store['offsets'][i + 1] - starts[k]
+            continue
+        align1, align2, ld = utils.align_pair(word1, word2, ipa_dict)
+        matrix = candidate_contexts.get_features(
+            [utils.to_phone(sound, ipa_dict) for sound in align1],
+            [utils.to_phone(sound, ipa_dict) for sound in align2])
+        alignments.append((align1, align2))
+        distances.append(ld)
+        starts[k] = n_rows
+        lengths[k] = len(matrix)
+        n_rows += len(matrix)
+        new_matrices.append(matrix)
+
+    rows = np.vstack([store['rows']] + new_matrices)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    store = dict(store, keys=list(keys), alignments=alignments,
+                 distances=np.array(distances),
+                 rows=rows[feature_store.segment_indices(starts, lengths)],
+                 offsets=offsets)
+    return store, len(new_matrices)
+
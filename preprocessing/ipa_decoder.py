@@ -0,0 +1,144 @@
+from . import transform_ipa as tipa
+from . import utils
+import numpy as np
+
+# The diacritics that utils.to_phone understands, combined with the symbols
+# of the IPA table to build the inventory of the decoder.
+consonant_diacritics = ['', 'ʲ', 'ː', 'ʲː']
+vowel_diacritics = ['', 'ː', 'ˑ', '̯']
+# affricates are added if both of their symbols are in the IPA table
+affricates = ['t͡s', 'd͡z', 't͡ʃ', 'd͡ʒ', 'p͡f', 't͡ɕ', 'ʈ͡ʂ', 'ɖ͡ʐ']
+
+CONSONANT = tipa.string2int('sound_type', 'consonant')
+VOWEL = tipa.string2int('sound_type', 'vowel')
+PLOSIVE = tipa.string2int('manner', 'plosive')
+AFFRICATE = tipa.string2int('manner', 'affricate')
+FRICATIVE = tipa.string2int('manner', 'fricative')
+# the column of each phonetic feature in a feature matrix
+feature_index = {feature: i
+                 for i, feature in enumerate(tipa.phonetic_features)}
+
+
+class SymbolDecoder(object):
+    """
+    Transforms Phones, e.g. the sounds of predicted words, into IPA symbols.
+    A Phone whose features match a symbol of the inventory exactly is looked
+    up in a dict (see utils.symbol_table for symbols with the same
+    features); any other Phone is mapped to the nearest symbol
+    (according to Phone.distance, preferring the earlier symbol in the
+    inventory in case of ties).
+
+    >>> decoder = SymbolDecoder(utils.read_ipa_dict('data/ipa_numerical.csv'))
+    >>> decoder.decode_words(predicted_words)
+    ['øɡə', ...]
+    """
+
+    def __init__(self, ipa_dict, extra_symbols=()):
+        """
+        Keyword arguments:
+        ipa_dict: A dict(str -> Phone) as created by utils.read_ipa_dict.
+        extra_symbols: Further symbol clusters for the inventory, e.g. the
+                       ones returned by phon_inventory.get_symbols
+                       (default: ()).
+        """
+        self.inventory = inventory(ipa_dict, extra_symbols)
+        self.symbols = utils.symbol_table(self.inventory)
+        # the symbols and their features, in the same order
+        self.symbol_list = list(self.symbols.values())
+        self.features = np.array(list(self.symbols.keys()), dtype=np.int64)
+
+    def decode_features(self, features):
+        """
+        Returns the symbol for each row of a feature matrix
+        (n_sounds x 10, in the order of transform_ipa.phonetic_features).
+        """
+        features = np.asarray(features, dtype=np.int64).reshape(
+            -1, len(tipa.phonetic_features))
+        unique, inverse = np.unique(features, axis=0, return_inverse=True)
+        symbols = [self.symbols.get(tuple(row)) for row in unique.tolist()]
+        missing = [i for i, symbol in enumerate(symbols) if symbol is None]
+        # the distances are computed for blocks of rows, to limit the memory
+        for start in range(0, len(missing), 4096):
+            block = missing[start:start + 4096]
+            nearest = distances(unique[block], self.features).argmin(axis=1)
+            for i, s in zip(block, nearest):
+                symbols[i] = self.symbol_list[s]
+        return [symbols[i] for i in inverse.ravel()]
+
+    def decode_words(self, words):
+        """
+        Transforms a list of words (list(Phone)s) into IPA strings, decoding
+        the sounds of all words at once. Word boundaries and gaps are left
+        out.
+        """
+        words = [[phone for phone in word if phone.sound_type > 2]
+                 for word in words]
+        symbols = self.decode_features([phone.features() for word in words
+                                        for phone in word])
+        result = []
+        start = 0
+        for word in words:
+            result.append(''.join(symbols[start:start + len(word)]))
+            start += len(word)
+        return result
+
+
+def inventory(ipa_dict, extra_symbols=()):
+    """
+    Returns a dict(str -> Phone) containing the consonants and vowels of the
+    IPA table, their variants with the diacritics in `consonant_diacritics`
+    and `vowel_diacritics`, the `affricates` and the `extra_symbols`.
+    """
+    consonants = [s for s, phone in ipa_dict.items()
+                  if phone.sound_type == CONSONANT]
+    vowels = [s for s, phone in ipa_dict.items() if phone.sound_type == VOWEL]
+    known_affricates = [s for s in affricates
+                        if s[0] in ipa_dict and s[-1] in ipa_dict]
+
+    symbols = [s + d for d in consonant_diacritics for s in consonants]
+    symbols += [s + d for d in vowel_diacritics for s in vowels]
+    symbols += [s + d for d in consonant_diacritics for s in known_affricates]
+    symbols += list(extra_symbols)
+    return {symbol: utils.to_phone(symbol, ipa_dict) for symbol in symbols}
+
+
+def distances(features1, features2):
+    """
+    Computes Phone.distance between all rows of two feature matrices.
+
+    Returns:
+    A numpy matrix (len(features1) x len(features2)).
+    """
+    a = np.asarray(features1)[:, None, :]
+    b = np.asarray(features2)[None, :, :]
+
+    def differ(feature):
+        column = feature_index[feature]
+        return a[..., column] != b[..., column]
+
+    def graded(feature):
+        # close values (e.g. neighbouring places) count half
+        column = feature_index[feature]
+        diff = np.abs(a[..., column] - b[..., column])
+        return np.where(diff == 0, 0, np.where(diff < 3, 0.5, 1))
+
+    manner1 = a[..., feature_index['manner']]
+    manner2 = b[..., feature_index['manner']]
+    stop_or_fricative1 = (manner1 == PLOSIVE) | (manner1 == FRICATIVE)
+    stop_or_fricative2 = (manner2 == PLOSIVE) | (manner2 == FRICATIVE)
+    # like Phone.distance, an affricate differs by 0.5 from a plosive or a
+    # fricative, and by 0 from any other manner
+    affricate = (manner1 == AFFRICATE) | (manner2 == AFFRICATE)
+    half = (((manner1 == AFFRICATE) & stop_or_fricative2) |
+            ((manner2 == AFFRICATE) & stop_or_fricative1))
+    manner = np.where(manner1 == manner2, 0,
+                      np.where(half, 0.5, np.where(affricate, 0, 1)))
+    both = differ('secondary') * 1.0 + differ('length')
+    consonant = (manner + graded('place') + differ('voice') + both) / 5
+    vowel = (graded('vertical') + graded('horizontal') +
+             differ('nasalization') + differ('rounding') + both) / 6
+
+    sound_type = a[..., feature_index['sound_type']]
+    dist = np.where(sound_type == CONSONANT, consonant,
+                    np.where(sound_type == VOWEL, vowel, 0.0))
+    return np.where(differ('sound_type'), 1.0, dist)
@@ -0,0 +1,163 @@
+from . import merge_lists
+import numpy as np
+import mmap
+import os
+import sys
+
+
+def build_index(lexicon, index_file=None, delimiter=',',
+                lang_col='lang_iso_code', concept_col='concept_id'):
+    """
+    Scans a (multi-language) word list once and saves the byte offsets of
+    its rows, sorted by language and concept ID.
+
+    Keyword arguments:
+    lexicon: a CSV/TSV file with a header row, e.g. a NorthEuraLex dump
+    index_file: the output file (default: lexicon + '.idx.npz')
+    delimiter: the column separator (default: ',')
+    lang_col: the name of the language column (default: 'lang_iso_code')
+    concept_col: the name of the concept column (default: 'concept_id')
+
+    Returns:
+    The name of the index file.
+    """
+    if index_file is None:
+        index_file = lexicon + '.idx.npz'
+
+    languages, concepts, offsets, lengths = [], [], [], []
+    with open(lexicon, 'rb') as f:
+        header = f.readline()
+        columns = header.decode('utf-8-sig').rstrip('\r\n').split(delimiter)
+        lang_index = columns.index(lang_col)
+        concept_index = columns.index(concept_col)
+        offset = len(header)
+        for line in f:
+            cells = line.decode('utf-8').split(delimiter)
+            if len(cells) > max(lang_index, concept_index):
+                languages.append(cells[lang_index].strip())
+                concepts.append(cells[concept_index].strip())
+                offsets.append(offset)
+                lengths.append(len(line))
+            offset += len(line)
+
+    languages = np.array(languages, dtype=str)
+    concepts = np.array(concepts, dtype=str)
+    offsets = np.array(offsets, dtype=np.int64)
+    # sort by language, then concept, then position in the file
+    order = np.lexsort((offsets, concepts, languages))
+    np.savez(index_file,
+             languages=languages[order], concepts=concepts[order],
+             offsets=offsets[order],
+             lengths=np.array(lengths, dtype=np.int64)[order],
+             columns=np.array(columns, dtype=str),
+             delimiter=np.array(delimiter),
+             size=np.array(os.path.getsize(lexicon)))
+    print("Indexed {} rows of {}.".format(len(offsets), lexicon))
+    return index_file
+
+
+class LexiconIndex(object):
+    """
+    Gives access to single languages or concepts of a large word list
+    without parsing the whole file. The word list is memory-mapped,
+    and only the rows listed in the index are read.
+
+    >>> with LexiconIndex('northeuralex.csv') as lexicon:
+    ...     concepts = lexicon.read_concepts('deu')
+    """
+
+    def __init__(self, lexicon, index_file=None):
+        if index_file is None:
+            index_file = lexicon + '.idx.npz'
+        index = np.load(index_file)
+        if int(index['size']) != os.path.getsize(lexicon):
+            raise ValueError('The index {} is out of date; rebuild it with '
+                             'build_index.'.format(index_file))
+        self.languages = index['languages']
+        self.concepts = index['concepts']
+        self.offsets = index['offsets']
+        self.lengths = index['lengths']
+        self.columns = index['columns'].tolist()
+        self.delimiter = str(index['delimiter'])
+        self.file = open(lexicon, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def row_range(self, lang, concept_id=None):
+        """Returns the range of index entries for a language (and concept)."""
+        start = np.searchsorted(self.languages, lang, side='left')
+        end = np.searchsorted(self.languages, lang, side='right')
+        if concept_id is not None:
+            concepts = self.concepts[start:end]
+            concept_id = str(concept_id)
+            end = start + np.searchsorted(concepts, concept_id, side='right')
+            start = start + np.searchsorted(concepts, concept_id, side='left')
+        return start, end
+
+    def rows(self, lang, concept_id=None):
+        """
+        Returns the rows of the given language (and concept) as lists of
+        cells, in the order in which they appear in the file.
+        """
+        start, end = self.row_range(lang, concept_id)
+        positions = np.sort(self.offsets[start:end])
+        lengths = dict(zip(self.offsets[start:end], self.lengths[start:end]))
+        return [self.mm[pos:pos + lengths[pos]].decode('utf-8')
+                .rstrip('\r\n').split(self.delimiter) for pos in positions]
+
+    def read_concepts(self, lang, ipa_col='raw_ipa', n_concepts=None):
+        """
+        Extracts the words of a language, like merge_lists.read_file,
+        but independent of the order of the rows. Assumes integer
+        concept IDs.
+
+        Returns:
+        concepts: list(list(str))
+                  where concepts[x-1] contains the words for concept x
+        """
+        concept_index = self.columns.index('concept_id')
+        ipa_index = self.columns.index(ipa_col)
+        words = {}
+        for cells in self.rows(lang):
+            concept_id = int(cells[concept_index])
+            words.setdefault(concept_id, []).append(cells[ipa_index])
+        if n_concepts is None:
+            n_concepts = max(words) if words else 0
+        return [words.get(concept_id, [])
+                for concept_id in range(1, n_concepts + 1)]
+
+
+def merge_from_lexicon(lexicon, lang1, lang2, out_dir):
+    """
+    Creates the bilingual word list {out_dir}/{lang1}-{lang2}-all.csv
+    from an indexed multi-language word list.
+    """
+    with LexiconIndex(lexicon) as index:
+        concepts1 = index.read_concepts(lang1)
+        concepts2 = index.read_concepts(lang2)
+    # both lists need an entry for every concept
+    n_concepts = max(len(concepts1), len(concepts2))
+    concepts1 += [[] for _ in range(n_concepts - len(concepts1))]
+    concepts2 += [[] for _ in range(n_concepts - len(concepts2))]
+    merge_lists.print_file(lang1, lang2, concepts1, concepts2, out_dir)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2:
+        build_index(sys.argv[1])
+    elif len(sys.argv) == 5:
+        merge_from_lexicon(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        sys.stderr.write('Usage: %s LEXICON\n'
+                         '       %s LEXICON LANG_NAME_1 LANG_NAME_2 '
+                         'OUTPUT_DIR\n' % (sys.argv[0], sys.argv[0]))
+        sys.exit(1)
@@ -0,0 +1,141 @@
+from . import alignment_cache
+from . import candidate_contexts
+from . import utils
+from .features import header_list, simple_file_name
+from multiprocessing import Process, Queue
+from collections import deque
+import numpy as np
+import os
+import tempfile
+import traceback
+import sys
+import re
+
+
+def stream_features(in_file, ipa_file, threshold=0.4, train_pct=1,
+                    cache_file=None, queue_size=16, batch_size=64):
+    """
+    Like features.generate_features, but the word pairs are processed as a
+    stream: one process aligns the word pairs, a second one extracts the
+    features of the cognates and the rows are written while the rest of the
+    word list is still being aligned. The stages are connected by bounded
+    queues, so only a few batches of word pairs are held in memory at once.
+
+    The output is the same as that of features.generate_features. Since the
+    number of cognates is only known at the end, the rows of a cognate pair
+    are written as soon as it is certain to be among the first `train_pct`
+    of the cognates. Until then, they are kept in a temporary file (and
+    only their number of rows is kept in memory).
+
+    Keyword arguments:
+    in_file: a bilingual word list, as created by merge_lists
+    ipa_file: the CSV file created by transform_ipa.transform_ipa
+    threshold: the maximum NED for cognate pairs (default: 0.4)
+    train_pct: percentage of the cognate pairs that are used for training
+    cache_file: an alignment_cache.AlignmentCache database (default: None)
+    queue_size: the maximum number of batches per queue (default: 16)
+    batch_size: the number of word pairs per batch (default: 64)
+    """
+    aligned = Queue(queue_size)
+    features = Queue(queue_size)
+    workers = [Process(target=_align_worker,
+                       args=(in_file, ipa_file, cache_file,
+                             batch_size, aligned)),
+               Process(target=_feature_worker,
+                       args=(threshold, aligned, features))]
+    for worker in workers:
+        worker.start()
+
+    out_file = re.sub('all', 'features', in_file)
+    levels = simple_file_name(in_file).split('-')[:2]
+    n_cognates = 0
+    n_written = 0
+    # the number of rows of each pair in the temporary file
+    pending = deque()
+    fd, pending_file = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        with open(out_file, 'w', encoding='utf-8') as f, \
+                open(pending_file, 'w', encoding='utf-8') as f_pending, \
+                open(pending_file, 'r', encoding='utf-8') as f_ready:
+            f.write(','.join(header_list(levels)) + '\n')
+            for batch in iter(features.get, None):
+                if isinstance(batch, str):
+                    raise RuntimeError(batch)
+                for matrix in batch:
+                    n_cognates += 1
+                    np.savetxt(f_pending, matrix, fmt='%d', delimiter=',')
+                    pending.append(len(matrix))
+                    if n_written >= round(n_cognates * train_pct):
+                        continue
+                    f_pending.flush()
+                    # the number of training pairs can only grow
+                    while n_written < round(n_cognates * train_pct):
+                        for _ in range(pending.popleft()):
+                            f.write(f_ready.readline())
+                        n_written += 1
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+        os.remove(pending_file)
+
+    print("Extracted the features for {} out of {} words."
+          .format(n_written, n_cognates))
+    print("Saved the features in {}.".format(out_file))
+
+
+def _align_worker(in_file, ipa_file, cache_file, batch_size, out_queue):
+    """Aligns the word pairs and passes them on in batches."""
+    try:
+        ipa_dict = utils.read_ipa_dict(ipa_file)
+        cache = None
+        if cache_file is not None:
+            cache = alignment_cache.AlignmentCache(cache_file, ipa_dict)
+        batch = []
+        with open(in_file, 'r', encoding='utf-8') as f:
+            next(f)
+            for line in f:
+                _, word1, word2 = utils.parse_line(line)
+                batch.append(utils.align_pair(word1, word2, ipa_dict,
+                                              True, cache))
+                if len(batch) == batch_size:
+                    out_queue.put(batch)
+                    batch = []
+        if batch:
+            out_queue.put(batch)
+        if cache is not None:
+            cache.close()
+        out_queue.put(None)
+    except Exception:
+        out_queue.put(traceback.format_exc())
+
+
+def _feature_worker(threshold, in_queue, out_queue):
+    """Extracts the feature rows of the cognate pairs."""
+    try:
+        for batch in iter(in_queue.get, None):
+            if isinstance(batch, str):
+                out_queue.put(batch)
+                return
+            out_queue.put([candidate_contexts.get_features(word1, word2)
+                           for (word1, word2, ld) in batch
+                           if ld < threshold])
+        out_queue.put(None)
+    except Exception:
+        out_queue.put(traceback.format_exc())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        sys.stderr.write('Usage: %s BILINGUAL_WORD_LIST IPA_FILE '
+                         'THRESHOLD TRAIN_DATA_PERCENTAGE [ALIGNMENT_CACHE]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+
+    stream_features(sys.argv[1], sys.argv[2],
+                    float(sys.argv[3]), float(sys.argv[4]),
+                    sys.argv[5] if len(sys.argv) > 5 else None)
@@ -63,6 +63,34 @@ def to_phone(symbol, ipa_dict):
     return phone
 
 
+# Symbols that win over the other symbols with the same features when the
+# IPA dictionary is inverted (ɧ has the same features as s in the IPA table).
+preferred_symbols = ['s']
+
+
+def symbol_table(ipa_dict, preferred=preferred_symbols):
+    """
+    Inverts the IPA dictionary: maps the features of each Phone to its
+    symbol. If several symbols share the same features, a symbol (cluster)
+    whose first symbol is in `preferred` wins, and otherwise the first one
+    in the IPA table.
+
+    :param ipa_dict: IPA dictionary
+    :type ipa_dict: dict(str -> Phone)
+    :param preferred: the symbols to prefer in case of ties
+    :type preferred: [str]
+    :return: the symbols by their features
+    :rtype: dict(tuple(int) -> str)
+    """
+    symbols = {}
+    for symbol, phone in ipa_dict.items():
+        features = tuple(phone.features())
+        if features not in symbols or (symbol[0] in preferred and
+                                       symbols[features][0] not in preferred):
+            symbols[features] = symbol
+    return symbols
+
+
 def lev_distance(w1, w2, ipa_dict):
     """
     Calculate the normalized modified levenshtein distance
@@ -253,7 +281,8 @@ def escape(character, return_phones, ipa_dict):
     return to_phone(character, ipa_dict) if return_phones else character
 
 
-def get_cognates(file, ipa_dict, threshold=0.4, return_phones=False):
+def get_cognates(file, ipa_dict, threshold=0.4, return_phones=False,
+                 cache=None):
     """
     Determine possible cognates using Normalized Levenshtein Distance.
     Align pairs before applying NLD.
@@ -266,34 +295,151 @@ def get_cognates(file, ipa_dict, threshold=0.4, return_phones=False):
     :type threshold: float
     :param return_phones: if True, return [Phone] else [str]
     :type return_phones: bool
+    :param cache: if given, alignments are looked up in / added to the cache
+    :type cache: alignment_cache.AlignmentCache
     :return:
     """
+    alignments = align_word_list(file, ipa_dict, return_phones, cache)
+    return split_cognates(alignments, threshold)
+
+
+def align_word_list(file, ipa_dict, return_phones=False, cache=None):
+    """
+    Aligns all word pairs of a word list and computes their NLDs, so that
+    the list can be split into cognates and non-cognates for any threshold
+    by split_cognates.
+
+    :param file: directory of the file
+    :type file: str
+    :param ipa_dict: IPA dictionary
+    :type ipa_dict: dict(str -> Phone)
+    :param return_phones: if True, return [Phone] else [str]
+    :type return_phones: bool
+    :param cache: if given, alignments are looked up in / added to the cache
+    :type cache: alignment_cache.AlignmentCache
+    :return: the entries (concept_id, word1, word2, rounded NLD) in the
+             order of the file, the indices of the entries sorted by NLD
+             and the sorted NLDs
+    :rtype: tuple(list(tuple), np.array, np.array)
+    """
     with open(file, 'r', encoding='utf-8') as f:
         content = f.readlines()[1:]
 
-    cognates = []
-    not_cognates = []
+    entries = []
+    distances = []
 
     for line in content:
-        line = re.sub(u'[\uFEFF\s|ˈˌ-]', '', line)
+        concept_id, word1, word2 = parse_line(line)
+        word1, word2, ld = align_pair(word1, word2, ipa_dict,
+                                      return_phones, cache)
+        entries.append((concept_id, word1, word2, round(ld, 2)))
+        distances.append(ld)
+
+    # A stable sort keeps the file order for identical distances.
+    ranking = np.argsort(distances, kind='stable')
+    return entries, ranking, np.array(distances)[ranking]
+
+
+def parse_line(line):
+    """
+    Splits a line of a bilingual word list into the concept ID and the
+    two words (without separators and stress marks).
+    """
+    concept_id, word1, word2 = clean_word(line).split(',')
+    return int(concept_id), word1, word2
+
 
-        concept_id, word1, word2 = line.split(',')
-        concept_id = int(concept_id)
-        word1 = process_line(word1)
-        word2 = process_line(word2)
+def clean_word(word):
+    """Removes whitespace, separators and stress marks from a word."""
+    return re.sub(u'[\uFEFF\s|ˈˌ-]', '', word)
 
-        word1, word2 = needleman_wunsch(word1, word2, ipa_dict, return_phones)
-        ld = lev_distance(word1, word2, ipa_dict)
-        entry = (concept_id, word1, word2, round(ld, 2))
-        if ld < threshold:
-            cognates.append(entry)
-        else:
-            not_cognates.append(entry)
 
+def align_pair(word1, word2, ipa_dict, return_phones=False, cache=None):
+    """
+    Aligns two words and computes their NLD.
+
+    :param word1: the first word, as returned by parse_line
+    :type word1: str
+    :param word2: the second word, as returned by parse_line
+    :type word2: str
+    :param ipa_dict: IPA dictionary
+    :type ipa_dict: dict(str -> Phone)
+    :param return_phones: if True, return [Phone] else [str]
+    :type return_phones: bool
+    :param cache: if given, the alignment is looked up in / added to the cache
+    :type cache: alignment_cache.AlignmentCache
+    :return: the aligned words and their NLD
+    :rtype: tuple(list, list, float)
+    """
+    if cache is not None:
+        word1, word2, ld = cached_alignment(word1, word2, ipa_dict, cache)
+        if return_phones:
+            word1 = [to_phone(sound, ipa_dict) for sound in word1]
+            word2 = [to_phone(sound, ipa_dict) for sound in word2]
+        return word1, word2, ld
+    word1, word2 = needleman_wunsch(process_line(word1), process_line(word2),
+                                    ipa_dict, return_phones)
+    return word1, word2, lev_distance(word1, word2, ipa_dict)
+
+
+def cached_alignment(word1, word2, ipa_dict, cache):
+    """
+    Returns the alignment (as lists of symbols) and the NLD of two words,
+    either from the cache or by computing and caching them.
+    """
+    cached = cache.get(word1, word2)
+    if cached is not None:
+        return cached
+    align1, align2 = needleman_wunsch(process_line(word1),
+                                      process_line(word2), ipa_dict)
+    ld = lev_distance(align1, align2, ipa_dict)
+    cache.put(word1, word2, align1, align2, ld)
+    return align1, align2, ld
+
+
+def encode_words(words, vocab):
+    """
+    Transforms words (lists of symbols) into a padded matrix of symbol IDs,
+    i.e. of the indices of the symbols in `vocab`. The positions after the
+    end of a word are 0.
+
+    :param words: the words
+    :type words: list(list(str))
+    :param vocab: the symbols, containing all symbols of the words
+    :type vocab: list(str)
+    :return: the matrix (n_words x max_length, at least one column) and the
+             length of each word
+    :rtype: tuple(np.array, np.array)
+    """
+    symbol_ids = {symbol: i for i, symbol in enumerate(vocab)}
+    lengths = np.array([len(word) for word in words], dtype=np.int64)
+    seqs = np.zeros((len(words), max(lengths.max(initial=0), 1)),
+                    dtype=np.int64)
+    for w, word in enumerate(words):
+        seqs[w, :len(word)] = [symbol_ids[symbol] for symbol in word]
+    return seqs, lengths
+
+
+def split_cognates(alignments, threshold):
+    """
+    Splits aligned word pairs into (potential) cognates and non-cognates.
+    The split is found with a binary search over the sorted NLDs.
+
+    :param alignments: the word pairs as returned by align_word_list
+    :type alignments: tuple(list(tuple), np.array, np.array)
+    :param threshold: pairs with an NLD below the threshold are cognates
+    :type threshold: float
+    :return: the cognates and the non-cognates, in the order of the file
+    :rtype: tuple(list(tuple), list(tuple))
+    """
+    entries, ranking, distances = alignments
+    n_cognates = np.searchsorted(distances, threshold, side='left')
+    cognates = [entries[i] for i in np.sort(ranking[:n_cognates])]
+    not_cognates = [entries[i] for i in np.sort(ranking[n_cognates:])]
     return cognates, not_cognates
 
 
-def print_cognates(file, ipa_dict, threshold=0.4):
+def print_cognates(file, ipa_dict, threshold=0.4, cache=None):
     """
     Reads a wordlist from a file and prints its contents into two new files,
     one for the (potential) cognates and one for the (potential) non-cognates.
@@ -311,8 +457,25 @@ def print_cognates(file, ipa_dict, threshold=0.4):
     ipa_dict: A dict(str -> Phone) as created by read_ipa_dict.
     threshold: The maximum NED two words can have to be considered cognate.
                (default: 0.4)
+    cache: An alignment_cache.AlignmentCache (default: None).
+    """
+    cognates, non_cognates = get_cognates(file, ipa_dict, threshold,
+                                          cache=cache)
+    write_cognates(file, cognates, non_cognates)
+
+
+def write_cognates(file, cognates, non_cognates):
+    """
+    Writes the cognates and non-cognates of the word list `file` into the
+    two files described in print_cognates.
+
+    :param file: the word list, as created by preprocessing.merge_lists
+    :type file: str
+    :param cognates: the cognates, as returned by split_cognates
+    :type cognates: list(tuple)
+    :param non_cognates: the non-cognates, as returned by split_cognates
+    :type non_cognates: list(tuple)
     """
-    cognates, non_cognates = get_cognates(file, ipa_dict, threshold)
     file_cog = re.sub('all', 'cognates', file)
     file_non_cog = re.sub('all', 'non-cognates', file)
 
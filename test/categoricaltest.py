@@ -0,0 +1,75 @@
+# Unit tests for tree/categorical.py
+import unittest
+import numpy as np
+from tree.categorical import CategoricalTree
+from tree.rules import get_rules, leaf_boxes, contains, combine_sets
+
+feature_names = ['deu_itself_place', 'swe_itself_manner', 'swe_itself_voice']
+
+
+class TestCategoricalTree(unittest.TestCase):
+
+    def test_subset_split(self):
+        # the label depends on whether column b is in {1, 4}, which needs
+        # two threshold splits but only one set split
+        data = np.array([[a, b, 0] for a in range(3) for b in range(6)] * 3)
+        labels = np.isin(data[:, 1], [1, 4]).astype(int)
+        clf = CategoricalTree().fit(data, labels)
+        self.assertEqual(1, clf.get_depth())
+        self.assertEqual(1, clf.tree_.feature[0])
+        self.assertEqual(labels.tolist(), clf.predict(data).tolist())
+        # values that did not occur in the training data go right
+        self.assertEqual(2, clf.apply(np.array([[0, 9, 0]]))[0])
+
+
+class TestSetRules(unittest.TestCase):
+
+    def setUp(self):
+        # every combination of place, manner and voice; the label states
+        # whether the manner is plosive (1) or affricate (4)
+        self.data = np.array([[place, manner, voice]
+                              for place in range(3)
+                              for manner in range(10)
+                              for voice in range(3)])
+        self.labels = np.isin(self.data[:, 1], [1, 4]).astype(int)
+        self.clf = CategoricalTree().fit(self.data, self.labels)
+
+    def test_rule_strings(self):
+        rules = get_rules(self.clf, ['other', 'stop'], feature_names)
+        self.assertEqual(2, len(rules))
+        self.assertIn('IF swe_itself_manner in {plosive, affricate} '
+                      'THEN stop', rules)
+        self.assertIn('IF swe_itself_manner in {N/A, tap, trill, fricative, '
+                      'lateral fricative, lateral approximant, approximant, '
+                      'nasal} THEN other', rules)
+
+    def test_leaf_boxes(self):
+        boxes = dict(leaf_boxes(self.clf.tree_))
+        # the root sends {1, 4} to the left child (node 1)
+        self.assertEqual({1: (frozenset({1, 4}), frozenset())}, boxes[1])
+        self.assertEqual({1: (None, frozenset({1, 4}))}, boxes[2])
+        manner = ['swe_itself_manner']
+        self.assertTrue(contains(boxes[1], manner, [frozenset({1, 4, 5})],
+                                 [True], feature_names))
+        self.assertFalse(contains(boxes[1], manner, [frozenset({1})],
+                                  [True], feature_names))
+        self.assertTrue(contains(boxes[2], manner, [frozenset({1})],
+                                 [False], feature_names))
+        self.assertFalse(contains(boxes[2], manner, [frozenset({1})],
+                                  [True], feature_names))
+
+    def test_combine_sets(self):
+        manner = ['swe_itself_manner', 'swe_itself_manner']
+        sets = [frozenset({1, 2, 3}), frozenset({3, 4})]
+        self.assertEqual((manner[:1], [frozenset({3})], [True], 'x'),
+                         combine_sets((manner, sets, [True, True], 'x')))
+        self.assertEqual((manner[:1], [frozenset({1, 2, 3, 4})], [False], 'x'),
+                         combine_sets((manner, sets, [False, False], 'x')))
+        self.assertEqual((manner[:1], [frozenset({1, 2})], [True], 'x'),
+                         combine_sets((manner, sets, [True, False], 'x')))
+        self.assertEqual((manner[:1], [frozenset({4})], [True], 'x'),
+                         combine_sets((manner, sets, [False, True], 'x')))
+
+
+if __name__ == '__main__':
+    unittest.main()
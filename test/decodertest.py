@@ -0,0 +1,41 @@
+# Unit tests for preprocessing/ipa_decoder.py
+import unittest
+from preprocessing import utils
+from preprocessing.ipa_decoder import SymbolDecoder
+
+ipa_dict = utils.read_ipa_dict('data/ipa_numerical.csv')
+
+
+def to_word(symbols):
+    return [utils.to_phone(symbol, ipa_dict) for symbol in symbols]
+
+
+class TestSymbolDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = SymbolDecoder(ipa_dict)
+
+    def test_exact_match(self):
+        # ɧ has the same features as s in the IPA table
+        self.assertEqual(['s', 'sː', 'z'], self.decoder.decode_features(
+            [ipa_dict['s'].features(), utils.to_phone('sː', ipa_dict)
+             .features(), ipa_dict['z'].features()]))
+        self.assertEqual(['ʃtʁaːsə', 'naːzə'], self.decoder.decode_words(
+            [to_word(['ʃ', 't', 'ʁ', 'aː', 's', 'ə']),
+             to_word(['n', 'aː', 'z', 'ə'])]))
+
+    def test_nearest_symbol(self):
+        # no consonant of the inventory is nasalized, and nasalization does
+        # not count for the distance between consonants
+        phone = utils.to_phone('s', ipa_dict)
+        phone.nasalization = 1
+        self.assertNotIn(tuple(phone.features()), self.decoder.symbols)
+        self.assertEqual(['s'], self.decoder.decode_features(
+            [phone.features()]))
+        word = to_word(['d', 'a'])
+        word[1].nasalization = 2
+        self.assertEqual(['da'], self.decoder.decode_words([word]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# Unit tests for tree/engine.py
+import unittest
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+from tree.rules import extract_rules
+from tree.engine import compile_rules, apply_rules, coverage
+
+feature_names = ['a', 'b', 'c']
+
+
+class TestApplyRules(unittest.TestCase):
+
+    def test_handwritten_rules(self):
+        rules = [(['a'], [0.5], [True], 'x'),
+                 (['a', 'b'], [0.5, 2.5], [False, True], 'y'),
+                 (['a', 'b', 'c'], [0.5, 2.5, 1.5], [False, False, True], 'z')]
+        data = np.array([[0, 5, 5],
+                         [1, 2, 5],
+                         [1, 3, 1],
+                         [1, 3, 2]])
+        rule_set = compile_rules(rules, feature_names)
+        rule_idx, classes = apply_rules(rule_set, data)
+        self.assertEqual([0, 1, 2, -1], rule_idx.tolist())
+        self.assertEqual(['x', 'y', 'z', None], classes.tolist())
+
+        counts, covered = coverage(rule_idx, len(rules))
+        self.assertEqual([1, 1, 1], counts.tolist())
+        self.assertEqual(0.75, covered)
+
+    def test_rules_from_tree(self):
+        rng = np.random.RandomState(0)
+        data = rng.randint(0, 6, size=(500, 3))
+        labels = (data[:, 0] > 2) + 2 * (data[:, 1] == 4)
+        clf = DecisionTreeClassifier(min_samples_leaf=5).fit(data, labels)
+        class_names = [str(c) for c in clf.classes_]
+        rules = extract_rules(clf, class_names, feature_names)
+
+        new_data = rng.randint(0, 6, size=(1000, 3))
+        rule_idx, classes = apply_rules(compile_rules(rules, feature_names),
+                                        new_data, chunk_size=64)
+        self.assertTrue((rule_idx >= 0).all())
+        self.assertEqual([str(c) for c in clf.predict(new_data)],
+                         classes.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
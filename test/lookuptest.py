@@ -0,0 +1,50 @@
+# Unit tests for tree/lookup.py
+import unittest
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+from tree.categorical import CategoricalTree
+from tree.lookup import LookupTree
+
+
+class TestLookupTree(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.data = rng.randint(0, 6, size=(500, 4))
+        self.labels = ((self.data[:, 0] > 2) +
+                       2 * np.isin(self.data[:, 1], [1, 4]))
+        # includes values that did not occur in the training data
+        self.new_data = rng.randint(0, 9, size=(1000, 4))
+
+    def check(self, clf):
+        lookup = LookupTree(clf, self.data)
+        keys = lookup.keys.copy()
+        for data in (self.data, self.new_data):
+            self.assertEqual(clf.predict(data).tolist(),
+                             lookup.predict(data).tolist())
+            self.assertTrue(np.allclose(clf.predict_proba(data),
+                                        lookup.predict_proba(data)))
+        # predicting does not change the table
+        self.assertEqual(keys.tolist(), lookup.keys.tolist())
+
+    def test_decision_tree(self):
+        self.check(DecisionTreeClassifier(min_samples_leaf=5)
+                   .fit(self.data, self.labels))
+
+    def test_categorical_tree(self):
+        self.check(CategoricalTree(min_samples_leaf=5)
+                   .fit(self.data, self.labels))
+
+    def test_multi_output_tree(self):
+        labels = np.column_stack((self.labels, self.data[:, 2] % 2))
+        clf = DecisionTreeClassifier().fit(self.data, labels)
+        lookup = LookupTree(clf)
+        self.assertEqual(clf.predict(self.new_data).tolist(),
+                         lookup.predict(self.new_data).tolist())
+        for p1, p2 in zip(clf.predict_proba(self.new_data),
+                          lookup.predict_proba(self.new_data)):
+            self.assertTrue(np.allclose(p1, p2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,8 @@
 import unittest
 from tree.rules import *
 from preprocessing import features as feat
-from sklearn.externals import joblib
+from sklearn.tree import DecisionTreeClassifier
+import joblib
 
 feature_order = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i',
                  'j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r',
@@ -392,5 +393,33 @@ class TestRuleSetFromTree(unittest.TestCase):
             self.assertTrue(rule in rules_str)
 
 
+class TestRuleStatistics(unittest.TestCase):
+
+    def test_counts(self):
+        rng = np.random.RandomState(0)
+        data = rng.randint(0, 5, size=(400, 3))
+        labels = (data[:, 0] > 1).astype(int) + (data[:, 2] == 3)
+        clf = DecisionTreeClassifier(max_depth=4).fit(data, labels)
+        names = ['a', 'b', 'c']
+        classes = ['', 'x', 'y']
+        rules = prune_rules(traverse(clf.tree_, 0, classes, names,
+                                     [], [], [], []), names)
+        stats = rule_statistics(clf, rules, classes, names, data, labels)
+
+        self.assertEqual(len(data), sum(support for support, _, _ in stats))
+        for (features, thresholds, decisions, class_name), \
+                (support, distribution, confidence) in zip(rules, stats):
+            covered = np.ones(len(data), dtype=bool)
+            for feature, threshold, decision in zip(features, thresholds,
+                                                    decisions):
+                col = data[:, names.index(feature)]
+                covered &= (col <= threshold) == decision
+            self.assertEqual(covered.sum(), support)
+            self.assertEqual(np.bincount(labels[covered], minlength=3)
+                             .tolist(), distribution.tolist())
+            class_idx = ['N/A', 'x', 'y'].index(class_name)
+            self.assertEqual(distribution[class_idx] / support, confidence)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,212 @@
+from sklearn.tree import _tree
+from collections import namedtuple
+import numpy as np
+
+# The nodes of a CategoricalTree, as parallel arrays like the ones of
+# sklearn.tree._tree.Tree, so that rules.extract_rules can traverse them.
+# feature: the column a node splits on (TREE_UNDEFINED for leaves)
+# threshold: the frozenset of values that go to the left child
+#            (the rules treat 'value in threshold' as the True decision)
+# children_left, children_right: the child nodes (TREE_LEAF for leaves)
+# value: the weighted class counts of each node (n_nodes x 1 x n_classes)
+Tree = namedtuple('Tree', ['feature', 'threshold', 'children_left',
+                           'children_right', 'value', 'node_count'])
+
+
+class CategoricalTree(object):
+    """
+    A decision tree for nominal features: each node splits the rows by
+    whether the value of a column is in a set of values, rather than by a
+    threshold. The columns must contain small non-negative integers (such as
+    the codes from transform_ipa), and for each column and node, all subsets
+    of the values that occur are tried.
+
+    The interface is a subset of the one of
+    sklearn.tree.DecisionTreeClassifier (fit, predict, predict_proba, apply,
+    classes_, tree_), so that the trees can be used by the evaluation and by
+    rules.get_rules.
+    """
+
+    def __init__(self, criterion='entropy', max_depth=None,
+                 min_samples_leaf=1, max_categories=13):
+        """
+        Keyword arguments:
+        criterion: 'entropy' or 'gini' (default: 'entropy')
+        max_depth: the maximum depth of the tree (default: None)
+        min_samples_leaf: the minimum (weighted) number of rows per leaf, or,
+                          if it is a float, the minimum fraction of rows
+                          (default: 1)
+        max_categories: the maximum number of values per column, which
+                        limits the number of subsets (default: 13)
+        """
+        self.criterion = criterion
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_categories = max_categories
+        self.n_outputs_ = 1
+
+    def fit(self, data, labels, sample_weight=None):
+        data = np.asarray(data, dtype=np.int64)
+        self.classes_, y = np.unique(labels, return_inverse=True)
+        y = y.ravel()
+        weights = (np.ones(len(data)) if sample_weight is None
+                   else np.asarray(sample_weight, dtype=float))
+        self.n_features_in_ = data.shape[1]
+        self.n_values_ = int(data.max(initial=0)) + 1
+        if data.min(initial=0) < 0 or self.n_values_ > self.max_categories:
+            raise ValueError("The columns must contain integers between 0 "
+                             "and {}.".format(self.max_categories - 1))
+        min_leaf = self.min_samples_leaf
+        if isinstance(min_leaf, float):
+            min_leaf = np.ceil(min_leaf * weights.sum())
+        self._min_leaf = max(min_leaf, 1)
+        self._mask_cache = {}
+
+        nodes = []
+        self._grow(data, y, weights, 0, nodes)
+        self.tree_ = self._to_arrays(nodes)
+        return self
+
+    def _grow(self, data, y, weights, depth, nodes):
+        """Adds the node for the given rows and its subtree to `nodes`."""
+        n_classes = len(self.classes_)
+        counts = np.bincount(y, weights=weights, minlength=n_classes)
+        node = {'value': counts}
+        nodes.append(node)
+        split = None
+        if ((self.max_depth is None or depth < self.max_depth) and
+                np.count_nonzero(counts) > 1 and
+                counts.sum() >= 2 * self._min_leaf):
+            split = self._best_split(data, y, weights, counts)
+        if split is None:
+            return
+        column, left_values = split
+        go_left = np.isin(data[:, column], list(left_values))
+        node['feature'] = column
+        node['threshold'] = left_values
+        node['left'] = len(nodes)
+        self._grow(data[go_left], y[go_left], weights[go_left], depth + 1,
+                   nodes)
+        node['right'] = len(nodes)
+        self._grow(data[~go_left], y[~go_left], weights[~go_left], depth + 1,
+                   nodes)
+
+    def _best_split(self, data, y, weights, counts):
+        """
+        Finds the column and the set of values with the largest impurity
+        decrease. The class counts of all columns and values are computed
+        at once (as a histogram of (column, value, class) triples), and for
+        each column, the class counts of all subsets of the values that occur
+        are derived from them with a single matrix product.
+
+        Returns:
+        A tuple(int, frozenset), or None if no split decreases the impurity.
+        """
+        n_rows, n_cols = data.shape
+        n_classes = len(self.classes_)
+        n_values = self.n_values_
+        flat = ((np.arange(n_cols) * n_values + data) * n_classes +
+                y[:, None])
+        hist = np.bincount(flat.ravel(), weights=np.repeat(weights, n_cols),
+                           minlength=n_cols * n_values * n_classes)
+        hist = hist.reshape(n_cols, n_values, n_classes)
+        present = hist.sum(axis=2) > 0
+        parent = counts.sum() * self._impurity(counts)
+
+        best_gain = 1e-12
+        split = None
+        for column in np.flatnonzero(present.sum(axis=1) > 1):
+            values = np.flatnonzero(present[column])
+            masks = self._masks(len(values))
+            left = masks @ hist[column, values]
+            right = counts - left
+            left_weight = left.sum(axis=1)
+            right_weight = right.sum(axis=1)
+            gain = parent - (left_weight * self._impurity(left) +
+                             right_weight * self._impurity(right))
+            gain[(left_weight < self._min_leaf) |
+                 (right_weight < self._min_leaf)] = -np.inf
+            best = np.argmax(gain)
+            if gain[best] > best_gain:
+                best_gain = gain[best]
+                split = (int(column),
+                         frozenset(values[masks[best] > 0].tolist()))
+        return split
+
+    def _masks(self, n_values):
+        """
+        Returns the subsets of `n_values` values for the left child, as a
+        matrix with one row per subset (the last value always goes right, so
+        that each split is listed once).
+        """
+        if n_values not in self._mask_cache:
+            subsets = np.arange(1, 2 ** (n_values - 1))
+            self._mask_cache[n_values] = (
+                (subsets[:, None] >> np.arange(n_values)) & 1).astype(float)
+        return self._mask_cache[n_values]
+
+    def _impurity(self, counts):
+        """The impurity of the class counts along the last axis."""
+        total = counts.sum(axis=-1, keepdims=True)
+        p = counts / np.maximum(total, 1e-12)
+        if self.criterion == 'gini':
+            return 1 - (p ** 2).sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.where(p > 0, p * np.log2(p), 0).sum(axis=-1)
+
+    def _to_arrays(self, nodes):
+        n_nodes = len(nodes)
+        feature = np.full(n_nodes, _tree.TREE_UNDEFINED, dtype=np.int64)
+        threshold = np.empty(n_nodes, dtype=object)
+        children_left = np.full(n_nodes, _tree.TREE_LEAF, dtype=np.int64)
+        children_right = np.full(n_nodes, _tree.TREE_LEAF, dtype=np.int64)
+        value = np.array([node['value'] for node in nodes])[:, None, :]
+        # the values that go left, as a lookup table for apply
+        self._left_table = np.zeros((n_nodes, self.n_values_), dtype=bool)
+        for i, node in enumerate(nodes):
+            if 'feature' in node:
+                feature[i] = node['feature']
+                threshold[i] = node['threshold']
+                children_left[i] = node['left']
+                children_right[i] = node['right']
+                self._left_table[i, list(node['threshold'])] = True
+        return Tree(feature, threshold, children_left, children_right,
+                    value, n_nodes)
+
+    def apply(self, data):
+        """Returns the index of the leaf each row ends up in."""
+        data = np.asarray(data, dtype=np.int64)
+        tree = self.tree_
+        node = np.zeros(len(data), dtype=np.int64)
+        while True:
+            active = np.flatnonzero(tree.feature[node] >= 0)
+            if len(active) == 0:
+                return node
+            current = node[active]
+            values = data[active, tree.feature[current]]
+            # values that did not occur in the training data go right
+            known = (values >= 0) & (values < self.n_values_)
+            go_left = known & self._left_table[
+                current, np.clip(values, 0, self.n_values_ - 1)]
+            node[active] = np.where(go_left, tree.children_left[current],
+                                    tree.children_right[current])
+
+    def predict_proba(self, data):
+        counts = self.tree_.value[self.apply(data), 0]
+        return counts / counts.sum(axis=1, keepdims=True)
+
+    def predict(self, data):
+        return self.classes_[np.argmax(self.tree_.value[self.apply(data), 0],
+                                       axis=1)]
+
+    def get_depth(self):
+        depth = np.zeros(self.tree_.node_count, dtype=np.int64)
+        for node in range(self.tree_.node_count):
+            if self.tree_.feature[node] >= 0:
+                for child in (self.tree_.children_left[node],
+                              self.tree_.children_right[node]):
+                    depth[child] = depth[node] + 1
+        return int(depth.max())
+
+    def get_n_leaves(self):
+        return int(np.sum(self.tree_.feature < 0))
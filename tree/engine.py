@@ -0,0 +1,198 @@
+from . import rules as rls
+from .tree import features_dict
+from preprocessing import feature_schema
+from collections import namedtuple
+import numpy as np
+import os
+import pickle
+import re
+import sys
+
+# A rule set in executable form.
+# columns, thresholds: the distinct conditions 'data[:, column] <= threshold'
+# need_true, need_false: bool matrices (n_rules x n_conditions) that state
+#                        which conditions must be met / must not be met
+#                        for a rule to apply
+# classes: an array containing the class name of each rule
+# sets, tables: the indices of the conditions 'data[:, column] in threshold'
+#               (rules from a categorical.CategoricalTree), and for each of
+#               them, a bool array stating which values are in the set
+RuleSet = namedtuple('RuleSet', ['columns', 'thresholds',
+                                 'need_true', 'need_false', 'classes',
+                                 'sets', 'tables'],
+                     defaults=(np.zeros(0, dtype=np.int64), None))
+
+
+def compile_rules(rules, feature_names):
+    """
+    Transforms rules into a form that can be applied to whole feature
+    matrices at once.
+
+    Keyword arguments:
+    rules: A list(tuple(list(str), list(float), list(bool), str))
+           as returned by rules.extract_rules.
+    feature_names: A list(str) containing the names of the columns of the
+                   matrices the rules will be applied to.
+
+    Returns:
+    A RuleSet.
+    """
+    conditions = sorted({(feature_names.index(feature), threshold)
+                         for (features, thresholds, _, _) in rules
+                         for feature, threshold in zip(features, thresholds)},
+                        key=_condition_key)
+    condition_idx = {condition: i for i, condition in enumerate(conditions)}
+
+    need_true = np.zeros((len(rules), len(conditions)), dtype=bool)
+    need_false = np.zeros((len(rules), len(conditions)), dtype=bool)
+    for r, (features, thresholds, decisions, _) in enumerate(rules):
+        for feature, threshold, decision in zip(features, thresholds,
+                                                decisions):
+            c = condition_idx[(feature_names.index(feature), threshold)]
+            if decision:
+                need_true[r, c] = True
+            else:
+                need_false[r, c] = True
+
+    sets = np.array([i for i, (_, t) in enumerate(conditions)
+                     if isinstance(t, frozenset)], dtype=np.int64)
+    tables = None
+    if len(sets):
+        n_values = max(max(conditions[i][1], default=0) for i in sets) + 1
+        tables = np.zeros((len(sets), n_values), dtype=bool)
+        for row, i in enumerate(sets):
+            tables[row, list(conditions[i][1])] = True
+    return RuleSet(np.array([c for c, _ in conditions], dtype=np.int64),
+                   np.array([np.nan if isinstance(t, frozenset) else t
+                             for _, t in conditions], dtype=float),
+                   need_true, need_false,
+                   np.array([rule[3] for rule in rules], dtype=object),
+                   sets, tables)
+
+
+def _condition_key(condition):
+    # the thresholds can be numbers or sets of values
+    column, threshold = condition
+    if isinstance(threshold, frozenset):
+        return column, 1, 0.0, sorted(threshold)
+    return column, 0, threshold, []
+
+
+def apply_rules(rule_set, data, chunk_size=65536):
+    """
+    Applies the rules to every row of a feature matrix. The conditions are
+    evaluated once per row, and the rules are matched against them with
+    matrix products, in chunks of `chunk_size` rows.
+
+    Keyword arguments:
+    rule_set: A RuleSet as returned by compile_rules.
+    data: A numpy matrix with the columns the rules were compiled for.
+    chunk_size: The number of rows processed at once (default: 65536).
+
+    Returns:
+    rule_idx: A numpy array containing the index of the first rule that
+              applies to each row, or -1 if no rule applies.
+    classes: A numpy array containing the class predicted for each row,
+             or None if no rule applies.
+    """
+    need_true = rule_set.need_true.T.astype(np.float32)
+    need_false = rule_set.need_false.T.astype(np.float32)
+    rule_idx = np.full(len(data), -1, dtype=np.int64)
+
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        values = chunk[:, rule_set.columns]
+        met = values <= rule_set.thresholds
+        if len(rule_set.sets):
+            n_values = rule_set.tables.shape[1]
+            set_values = values[:, rule_set.sets]
+            known = (set_values >= 0) & (set_values < n_values)
+            met[:, rule_set.sets] = known & rule_set.tables[
+                np.arange(len(rule_set.sets)),
+                np.clip(set_values, 0, n_values - 1)]
+        met = met.astype(np.float32)
+        # the number of conditions each rule violates
+        violations = (1 - met) @ need_true + met @ need_false
+        matched = violations == 0
+        first = matched.argmax(axis=1)
+        rule_idx[start:start + chunk_size] = np.where(
+            matched[np.arange(len(chunk)), first], first, -1)
+
+    classes = np.append(rule_set.classes, None)[rule_idx]
+    return rule_idx, classes
+
+
+def coverage(rule_idx, n_rules):
+    """
+    Returns the number of rows each rule applies to and the fraction of rows
+    that are covered by any rule.
+    """
+    counts = np.bincount(rule_idx[rule_idx >= 0], minlength=n_rules)
+    return counts, counts.sum() / max(len(rule_idx), 1)
+
+
+def check_rules(features_file, feature, out_dir=None):
+    """
+    Applies the rules of a trained tree to the rows of a feature file and
+    reports their coverage and accuracy.
+
+    Keyword arguments:
+    features_file: the CSV file created by features.generate_features
+    feature: the predicted column, e.g. 'deu_itself_manner'
+    out_dir: if given, the number of rows per rule is saved in
+             {out_dir}/{lang}_{feature}_coverage.csv (default: None)
+    """
+    schema = feature_schema.from_file(features_file)
+    # the tree may have been trained on fewer columns (tree.reduce_columns)
+    schema_file = 'evaluation/classifiers/{}_schema.pickle'.format(
+        feature.split('_')[0])
+    if os.path.exists(schema_file):
+        saved = feature_schema.load(schema_file)
+        if saved == schema:
+            schema = saved
+    data_cols, label_col = schema.data_columns(feature)
+    feature_names = schema.feature_names(feature)
+    matrix = np.loadtxt(features_file, delimiter=",", dtype=np.int32,
+                        skiprows=1)
+
+    feature_name_with_lang = re.sub('itself_', '', feature)
+    with open('evaluation/classifiers/' + feature_name_with_lang + '.pickle',
+              'rb') as handle:
+        clf = pickle.load(handle)
+    if not hasattr(clf, 'tree_'):
+        # an ensemble (see tree.train_model), described by a surrogate tree
+        with open('evaluation/classifiers/' + feature_name_with_lang +
+                  '_surrogate.pickle', 'rb') as handle:
+            clf = pickle.load(handle)
+    types = features_dict[feature.split("_itself_")[-1]]
+    class_names = [types[i] for i in clf.classes_]
+    rules = rls.extract_rules(clf, class_names, feature_names)
+    rule_set = compile_rules(rules, feature_names)
+
+    rule_idx, classes = apply_rules(rule_set, matrix[:, data_cols])
+    counts, covered = coverage(rule_idx, len(rules))
+    label_names = np.array(['N/A' if t == '' else t for t in types],
+                           dtype=object)
+    labels = label_names[matrix[:, label_col]]
+    print("{} rules, {} rows".format(len(rules), len(matrix)))
+    print("coverage: {}".format(round(covered, 4)))
+    print("accuracy: {}".format(round(np.mean(classes == labels), 4)))
+
+    if out_dir:
+        out_file = '{}/{}_coverage.csv'.format(out_dir, feature_name_with_lang)
+        with open(out_file, 'w', encoding='utf-8') as f:
+            f.write('rows,correct,rule\n')
+            for r, rule in enumerate(rules):
+                correct = np.sum((rule_idx == r) & (classes == labels))
+                f.write('{},{},"{}"\n'.format(counts[r], correct,
+                                              rls.lists2rule(*rule)))
+        print("Saved the coverage in {}.".format(out_file))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.stderr.write('Usage: %s FEATURES FEATURE [OUTPUT_DIR]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+    check_rules(sys.argv[1], sys.argv[2],
+                sys.argv[3] if len(sys.argv) > 3 else None)
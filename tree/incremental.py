@@ -0,0 +1,50 @@
+from preprocessing import incremental
+from .tree import build_trees, engines
+import sys
+
+
+def update(lang1, file1, lang2, file2, ipa_file, data_dir, out_dir,
+           threshold=0.4, train_pct=0.9, multi_output=False, engine='tree',
+           n_jobs=-1):
+    """
+    Updates the word lists and features of a language pair with
+    preprocessing.incremental.update and rebuilds the trees with
+    tree.build_trees if the training data or the kind of trees has changed.
+
+    Keyword arguments:
+    out_dir: the output directory for the trees
+    multi_output, engine, n_jobs: the kind of trees, see tree.build_trees
+                                  (default: False, 'tree', -1)
+    The other arguments are passed to preprocessing.incremental.update.
+
+    Returns:
+    True if the trees were rebuilt.
+    """
+    def build(features_file):
+        build_trees(features_file, out_dir, multi_output, engine, n_jobs)
+
+    return incremental.update(lang1, file1, lang2, file2, ipa_file, data_dir,
+                              threshold, train_pct, build,
+                              (multi_output, engine))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 8:
+        sys.stderr.write('Usage: %s LANG_NAME_1 WORDLIST_1 LANG_NAME_2 '
+                         'WORDLIST_2 IPA_FILE DATA_DIR OUTPUT_DIR '
+                         '[THRESHOLD [TRAIN_DATA_PERCENTAGE]] [multi] '
+                         '[forest | boosting | categorical] [N_JOBS]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+    options = sys.argv[8:]
+    # the threshold and percentage are written with a decimal point
+    fractions = [float(option) for option in options if '.' in option]
+    n_jobs = [int(option) for option in options
+              if option.lstrip('-').isdigit()]
+    update(*sys.argv[1:8],
+           threshold=fractions[0] if fractions else 0.4,
+           train_pct=fractions[1] if len(fractions) > 1 else 0.9,
+           multi_output='multi' in options,
+           engine=([option for option in options if option in engines] +
+                   ['tree'])[0],
+           n_jobs=n_jobs[0] if n_jobs else -1)
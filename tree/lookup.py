@@ -0,0 +1,149 @@
+import numpy as np
+
+
+class LookupTree(object):
+    """
+    A trained decision tree (a sklearn.tree.DecisionTreeClassifier,
+    including multi-output trees, or a categorical.CategoricalTree) in a
+    form that predicts a batch of rows with a few array operations instead
+    of traversing the tree.
+
+    The columns contain small non-negative integers, and the tree only
+    distinguishes the values of a column by the splits on that column: all
+    values that take the same branch at every split on a column are put into
+    the same bin. The bins of the columns the tree uses are combined into a
+    single (mixed-radix) integer key per row, which determines the leaf.
+    Since the number of possible keys is far too large for a dense table
+    (10^9 to 10^13 for most of the deu-swe trees), the keys of the rows the
+    tree was trained on are stored in a sorted array and looked up with
+    np.searchsorted. Rows with an unknown key are passed to the tree. The
+    table is never changed after it is built, so predicting does not modify
+    the object, and it can be shared between threads.
+
+    >>> lookup = LookupTree(clf, data)
+    >>> lookup.predict_proba(new_data)  # same as clf.predict_proba(new_data)
+    """
+
+    def __init__(self, clf, data=None):
+        """
+        Keyword arguments:
+        clf: the trained tree
+        data: the rows whose keys are stored in advance, e.g. the training
+              data (default: None)
+        """
+        self.clf = clf
+        self.classes_ = clf.classes_
+        self.n_outputs_ = clf.n_outputs_
+        tree = clf.tree_
+        self.columns = np.unique(tree.feature[tree.feature >= 0])
+        # value -> bin for each column (larger values are clipped to the
+        # last value, which takes the same branches)
+        self.n_values = _n_values(tree)
+        self.bins = np.zeros((len(self.columns), self.n_values),
+                             dtype=np.int64)
+        radix = []
+        for i, column in enumerate(self.columns):
+            self.bins[i], n_bins = _column_bins(tree, column, self.n_values)
+            radix.append(n_bins)
+        # the keys must fit into int64
+        if np.prod(radix, dtype=object) > np.iinfo(np.int64).max:
+            raise ValueError("The tree uses too many columns for a lookup "
+                             "table.")
+        self.strides = np.cumprod([1] + radix, dtype=np.int64)[:-1]
+
+        # the probabilities and the predicted class of each node
+        value = tree.value
+        if self.n_outputs_ == 1:
+            classes = [self.classes_]
+        else:
+            classes = self.classes_
+        self.probas = []
+        self.predictions = []
+        for output, output_classes in enumerate(classes):
+            counts = value[:, output, :len(output_classes)]
+            self.probas.append(counts / counts.sum(axis=1, keepdims=True))
+            self.predictions.append(
+                np.asarray(output_classes)[np.argmax(counts, axis=1)])
+
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.leaves = np.zeros(0, dtype=np.int64)
+        if data is not None and len(data):
+            data = np.asarray(data)
+            self.keys, index = np.unique(self.keys_of(data),
+                                         return_index=True)
+            self.leaves = clf.apply(data[index]).astype(np.int64)
+
+    def keys_of(self, data):
+        """Returns the key of each row."""
+        data = np.asarray(data)
+        values = np.clip(data[:, self.columns], 0, self.n_values - 1)
+        return (self.bins[np.arange(len(self.columns)), values]
+                @ self.strides)
+
+    def apply(self, data):
+        """
+        Returns the index of the leaf each row ends up in. The rows whose
+        key is not in the table are passed to the tree.
+        """
+        keys = self.keys_of(data)
+        idx = np.minimum(np.searchsorted(self.keys, keys),
+                         len(self.keys) - 1)
+        found = np.zeros(len(keys), dtype=bool)
+        if len(self.keys):
+            found = self.keys[idx] == keys
+        leaves = np.empty(len(keys), dtype=np.int64)
+        leaves[found] = self.leaves[idx[found]]
+        if not found.all():
+            missing = ~found
+            leaves[missing] = self.clf.apply(np.asarray(data)[missing])
+        return leaves
+
+    def predict_proba(self, data):
+        leaves = self.apply(data)
+        if self.n_outputs_ == 1:
+            return self.probas[0][leaves]
+        return [probas[leaves] for probas in self.probas]
+
+    def predict(self, data):
+        leaves = self.apply(data)
+        if self.n_outputs_ == 1:
+            return self.predictions[0][leaves]
+        return np.column_stack([predictions[leaves]
+                                for predictions in self.predictions])
+
+
+def _n_values(tree):
+    """
+    Returns the number of values per column the bins have to describe:
+    all larger values take the same branches as the last one.
+    """
+    n_values = 1
+    for node in np.flatnonzero(tree.feature >= 0):
+        threshold = tree.threshold[node]
+        if isinstance(threshold, frozenset):
+            n_values = max(n_values, max(threshold, default=0) + 2)
+        else:
+            n_values = max(n_values, int(np.floor(threshold)) + 2)
+    return n_values
+
+
+def _column_bins(tree, column, n_values):
+    """
+    Groups the values 0, ..., n_values - 1 of a column by the branches
+    they take at the splits on the column.
+
+    Returns:
+    The bin of each value and the number of bins.
+    """
+    values = np.arange(n_values)
+    branches = []
+    for node in np.flatnonzero(tree.feature == column):
+        threshold = tree.threshold[node]
+        if isinstance(threshold, frozenset):
+            branches.append(np.isin(values, list(threshold)))
+        else:
+            branches.append(values <= threshold)
+    _, bins = np.unique(np.array(branches).T, axis=0, return_inverse=True)
+    bins = bins.ravel()
+    return bins, int(bins.max()) + 1
+
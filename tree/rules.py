@@ -6,7 +6,8 @@ import numpy as np
 import itertools
 
 
-def get_rules(clf, class_names, feature_names):
+def get_rules(clf, class_names, feature_names, output=0,
+              data=None, labels=None):
     """
     Extracts the rules from a decision tree classifier.
     The keyword arguments correspond to the objects returned by
@@ -16,13 +17,17 @@ def get_rules(clf, class_names, feature_names):
     clf: A sklearn.tree.DecisionTreeClassifier.
     class_names: A list(str) containing the class names.
     feature_names: A list(str) containing the feature names.
+    output: The index of the predicted feature, for classifiers with
+            several outputs (default: 0).
+    data: The training data. If given (together with `labels`), each rule is
+          annotated with its support, confidence and class distribution,
+          and the rules are sorted by their support (default: None).
+    labels: The labels of the training data (default: None).
 
     Returns:
     A list(str) where each element is a rule describing a leaf node.
     """
-    tree = clf.tree_
-    rules = traverse(tree, 0, class_names, feature_names, [], [], [], [])
-    rules = prune_rules(rules, feature_names)
+    rules = extract_rules(clf, class_names, feature_names, output)
 
     n_rules = len(rules)
     print('\tExtracted', n_rules, 'rule' + ('s.' if n_rules > 1 else '.'))
@@ -32,12 +37,155 @@ def get_rules(clf, class_names, feature_names):
         rule = lists2rule(features, thresholds, decisions, class_name)
         rules_str.append(rule)
 
-    return rules_str
+    if data is None or labels is None:
+        return rules_str
+
+    stats = rule_statistics(clf, rules, class_names, feature_names,
+                            data, labels, output)
+    display_names = [name if name != '' else 'N/A' for name in class_names]
+    annotated = []
+    for rule, (support, distribution, confidence) in zip(rules_str, stats):
+        distribution = ', '.join('{}: {}'.format(name, count)
+                                 for name, count in zip(display_names,
+                                                        distribution)
+                                 if count > 0)
+        annotated.append((support, '{} (support: {}, confidence: {}; {})'
+                          .format(rule, int(support), round(confidence, 2),
+                                  distribution)))
+    # sort by support, keeping the original order for equal support
+    annotated.sort(key=lambda x: -x[0])
+    return [rule for _, rule in annotated]
+
+
+def rule_statistics(clf, rules, class_names, feature_names,
+                    data, labels, output=0):
+    """
+    Computes how many rows of the given data each rule covers and how pure
+    the rules are. The rows are assigned to the leaves with a single call to
+    clf.apply, and the class counts of the leaves are added up for the
+    (possibly merged) rules that contain them.
+
+    Keyword arguments:
+    clf: The sklearn.tree.DecisionTreeClassifier the rules were extracted
+         from.
+    rules: A list(tuple(list(str), list(float), list(bool), str))
+           as returned by extract_rules.
+    class_names: A list(str) containing the class names.
+    feature_names: A list(str) containing the feature names.
+    data: A numpy matrix with the columns described by `feature_names`.
+    labels: A numpy array containing the labels of the rows.
+    output: The index of the predicted feature, for classifiers with
+            several outputs (default: 0).
+
+    Returns:
+    A list(tuple(int, np.array, float)) containing the support, the class
+    distribution (in the order of `class_names`) and the confidence
+    (the share of the predicted class) of each rule.
+    """
+    tree = clf.tree_
+    classes = clf.classes_[output] if clf.n_outputs_ > 1 else clf.classes_
+    n_classes = len(classes)
+
+    leaves = clf.apply(data)
+    label_idx = np.searchsorted(classes, labels)
+    leaf_counts = np.bincount(leaves * n_classes + label_idx,
+                              minlength=tree.node_count * n_classes)
+    leaf_counts = leaf_counts.reshape(tree.node_count, n_classes)
+
+    rule_counts = np.zeros((len(rules), n_classes), dtype=np.int64)
+    for leaf, box in leaf_boxes(tree):
+        for r, (features, thresholds, decisions, _) in enumerate(rules):
+            if contains(box, features, thresholds, decisions, feature_names):
+                rule_counts[r] += leaf_counts[leaf]
+                break
+
+    display_names = [name if name != '' else 'N/A' for name in class_names]
+    stats = []
+    for (_, _, _, class_name), counts in zip(rules, rule_counts):
+        support = counts.sum()
+        confidence = (counts[display_names.index(class_name)] / support
+                      if support > 0 else 0.)
+        stats.append((support, counts, confidence))
+    return stats
+
+
+def leaf_boxes(tree):
+    """
+    Returns a list(tuple(int, dict(int -> list(float)))) with the index of
+    each leaf node and the [lower, upper] bounds its path sets for the
+    features, where feature values v satisfy lower < v <= upper.
+    For the subset splits of a categorical.CategoricalTree, the bounds are
+    a tuple(frozenset, frozenset) instead: the values v satisfy
+    v in included (unless included is None) and v not in excluded.
+    """
+    boxes = []
+    stack = [(0, {})]
+    while stack:
+        node, box = stack.pop()
+        feature = tree.feature[node]
+        if feature == _tree.TREE_UNDEFINED:
+            boxes.append((node, box))
+            continue
+        threshold = tree.threshold[node]
+        if isinstance(threshold, frozenset):
+            included, excluded = box.get(feature, (None, frozenset()))
+            left = dict(box)
+            left[feature] = (threshold if included is None
+                             else included & threshold, excluded)
+            right = dict(box)
+            right[feature] = (included, excluded | threshold)
+            stack.append((tree.children_left[node], left))
+            stack.append((tree.children_right[node], right))
+            continue
+        lower, upper = box.get(feature, [-np.inf, np.inf])
+        left = dict(box)
+        left[feature] = [lower, min(upper, threshold)]
+        right = dict(box)
+        right[feature] = [max(lower, threshold), upper]
+        stack.append((tree.children_left[node], left))
+        stack.append((tree.children_right[node], right))
+    return boxes
+
+
+def contains(box, features, thresholds, decisions, feature_names):
+    """Checks whether all values within the box satisfy the given rule."""
+    for feature, threshold, decision in zip(features, thresholds, decisions):
+        if isinstance(threshold, frozenset):
+            included, excluded = box.get(feature_names.index(feature),
+                                         (None, frozenset()))
+            if decision and (included is None or
+                             not included - excluded <= threshold):
+                return False
+            if not decision and (threshold - excluded if included is None
+                                 else (included - excluded) & threshold):
+                return False
+            continue
+        lower, upper = box.get(feature_names.index(feature),
+                               [-np.inf, np.inf])
+        if decision and upper > threshold:
+            return False
+        if not decision and lower < threshold:
+            return False
+    return True
+
+
+def extract_rules(clf, class_names, feature_names, output=0):
+    """
+    Extracts the pruned rules from a decision tree classifier.
+    The keyword arguments are the same as for get_rules.
+
+    Returns:
+    A list(tuple(list(str), list(float), list(bool), str)) where each element
+    is a rule describing one or more leaf nodes.
+    """
+    rules = traverse(clf.tree_, 0, class_names, feature_names,
+                     [], [], [], [], output)
+    return prune_rules(rules, feature_names)
 
 
 def traverse(tree, node,
              class_names, feature_names,
-             features, thresholds, decisions, rules):
+             features, thresholds, decisions, rules, output=0):
     """
     A recursive method for performing a pre-order traversal of a given tree,
     while collecting the rules it contains.
@@ -55,6 +203,8 @@ def traverse(tree, node,
                node, corresponding to `features` and `thresholds`.
     rules: A list(tuple(list(str), list(float), list(bool), str))
            containing the rules encountered so far.
+    output: The index of the output whose classes the rules describe
+            (default: 0).
 
     Returns:
     rules: A list(tuple(list(str), list(float), list(bool), str))
@@ -68,7 +218,7 @@ def traverse(tree, node,
     if tree.feature[node] == _tree.TREE_UNDEFINED:
         # leaf node
         # tree.value contains the class distributions
-        class_name = int2class(tree.value[node], class_names)
+        class_name = int2class(tree.value[node][output], class_names)
         rule = (deepcopy(features), deepcopy(thresholds), deepcopy(decisions),
                 deepcopy(class_name))
         rules.append(rule)
@@ -91,12 +241,12 @@ def traverse(tree, node,
     traverse(tree, tree.children_left[node],
              class_names, feature_names,
              deepcopy(features), deepcopy(thresholds), deepcopy(decisions),
-             rules)
+             rules, output)
 
     decisions[-1] = False
     traverse(tree, tree.children_right[node],
              class_names, feature_names,
-             features, thresholds, decisions, rules)
+             features, thresholds, decisions, rules, output)
 
     return rules
 
@@ -174,8 +324,10 @@ def sort(rule, feature_order):
     indices = [feature_order.index(x) for x in features]
     # secondary sort order: decisions
     indices = [x + 0.1 if decisions[i] else x for i, x in enumerate(indices)]
-    # tertiary sort order: thresholds
-    indices = [x + (thresholds[i] / 1000.) for i, x in enumerate(indices)]
+    # tertiary sort order: thresholds (not for sets of values)
+    indices = [x + (thresholds[i] / 1000.)
+               if not isinstance(thresholds[i], frozenset) else x
+               for i, x in enumerate(indices)]
     indices = np.array(indices).argsort()
     features = np.array(features)[indices]
     thresholds = np.array(thresholds)[indices]
@@ -203,12 +355,15 @@ def shorten_rule(rule):
     if len(rule) < 2:
         return rule
 
+    rule = combine_sets(rule)
     remove_indices = []
     (features, thresholds, decisions, class_name) = rule
 
     for i in range(1, len(features)):
         if features[i] != features[i - 1]:
             continue
+        if isinstance(thresholds[i], frozenset):
+            continue
         if decisions[i] and decisions[i - 1]:  # less-than-or-equal-to
             remove_indices.append(i)
         elif (not decisions[i]) and (not decisions[i - 1]):  # bigger than
@@ -222,6 +377,43 @@ def shorten_rule(rule):
     return (*lists, class_name)
 
 
+def combine_sets(rule):
+    """
+    Replaces consecutive conditions on the same feature that test whether
+    the value is in a set of values (see categorical.CategoricalTree) by a
+    single condition.
+
+    >>> combine_sets((['place', 'place'], [frozenset({1, 2, 3}),
+                      frozenset({3, 4})], [True, False], 'voiced'))
+    (['place'], [frozenset({1, 2})], [True], 'voiced')
+    """
+    (features, thresholds, decisions, class_name) = rule
+    if not any(isinstance(threshold, frozenset) for threshold in thresholds):
+        return rule
+    new_features, new_thresholds, new_decisions = [], [], []
+    for feature, threshold, decision in zip(features, thresholds, decisions):
+        if (isinstance(threshold, frozenset) and new_features and
+                new_features[-1] == feature and
+                isinstance(new_thresholds[-1], frozenset)):
+            previous, previous_decision = new_thresholds[-1], new_decisions[-1]
+            if previous_decision and decision:
+                new_thresholds[-1] = previous & threshold
+            elif not previous_decision and not decision:
+                new_thresholds[-1] = previous | threshold
+            else:
+                # in one set, but not in the other one
+                included, excluded = ((previous, threshold)
+                                      if previous_decision
+                                      else (threshold, previous))
+                new_thresholds[-1] = included - excluded
+                new_decisions[-1] = True
+            continue
+        new_features.append(feature)
+        new_thresholds.append(threshold)
+        new_decisions.append(decision)
+    return new_features, new_thresholds, new_decisions, class_name
+
+
 def merge_and_shorten_rules(rule1, rule2):
     """
     If possible, this method merges the given rules.
@@ -278,7 +470,10 @@ def equals(list1, list2):
     if len(list1) != len(list2):
         return False
     for (elem1, elem2) in zip(list1, list2):
-        if not utils.equals(elem1, elem2):
+        if isinstance(elem1, frozenset) or isinstance(elem2, frozenset):
+            if elem1 != elem2:
+                return False
+        elif not utils.equals(elem1, elem2):
             return False
     return True
 
@@ -307,7 +502,8 @@ def lists2rule(features, thresholds, decisions, class_name):
     while i < len(features):
         feature, threshold, decision = features[i], thresholds[i], decisions[i]
         try:
-            if feature == features[i + 1]:
+            if (feature == features[i + 1] and
+                    not isinstance(threshold, frozenset)):
                 # If a segment like 'A > 2'
                 # is followed by a segment like 'A < 7',
                 # merge them (e.g. '2 <= A < 7').
@@ -332,7 +528,8 @@ def rule_segment2string(feature, threshold, decision, lower_bound=-1):
     Keyword arguments:
     feature: A str containing the feature name.
     threshold: A float that is the decision node threshold,
-               corresponding to `feature`.
+               corresponding to `feature`, or a frozenset of the values
+               for which the decision is True.
     decisions: A bool containing the decision,
                corresponding to `feature` and `threshold`.
     lower_bound: A float describing a secondary threshold
@@ -353,6 +550,13 @@ def rule_segment2string(feature, threshold, decision, lower_bound=-1):
     feature_str = getattr(tipa, feature_name)
     feature_str[0] = 'N/A'
 
+    if isinstance(threshold, frozenset):
+        feature_str = [name for value, name in enumerate(feature_str)
+                       if (value in threshold) == decision]
+        if len(feature_str) == 1:
+            return feature + ' is ' + feature_str[0]
+        return feature + ' in {' + ', '.join(feature_str) + '}'
+
     threshold = int(threshold) + 1
     lower_bound = int(lower_bound) + 1
     feature_str = (feature_str[lower_bound:threshold] if decision
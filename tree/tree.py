@@ -1,8 +1,13 @@
 from sklearn import tree
+from sklearn import ensemble
+from preprocessing import feature_schema
 from preprocessing import transform_ipa as tipa
 from preprocessing.features import simple_file_name
+from . import categorical
+from . import lookup
 from . import rules
 import numpy as np
+import os
 import pickle
 import graphviz
 import re
@@ -10,90 +15,404 @@ import sys
 
 
 features_dict = dict(zip(tipa.phonetic_features[1:], tipa.all_features[1:]))
+default_params = {'criterion': 'entropy', 'min_samples_leaf': 0.01}
+# The classifiers build_tree can train instead of a single decision tree.
+# For the ensembles, the rules are extracted from a surrogate tree (see
+# surrogate_tree). 'categorical' is a tree with set splits on the nominal
+# columns (see categorical.CategoricalTree).
+engines = ['tree', 'forest', 'boosting', 'categorical']
+ensembles = ['forest', 'boosting']
+forest_params = dict(default_params, n_estimators=100)
+boosting_params = {'max_iter': 100, 'learning_rate': 0.1}
 
 
-def build_tree(in_file, out_dir, feature, types):
+def build_tree(in_file, out_dir, feature, types, params=None, schema=None,
+               engine='tree', n_jobs=None, matrix=None):
+    """
+    Builds the tree for one feature and extracts its rules. `matrix` is the
+    content of the feature file (see load_matrix), which is read if it is
+    not given.
+    """
     feature_name_with_lang = re.sub('itself_', '', feature)
     print("Building the tree for {}.".format(feature_name_with_lang))
 
-    with open(in_file, 'r', encoding='utf-8') as f:
-        header = f.readlines()[0]
-        header = re.sub('[# \\n]', '', header)
-        header = header.split(',')
-
-    # Exclude certain information from the training data:
-    # - the column that we want to predict (label_col)
-    # - columns about features that are too similar to label_col
-    #   (prevOrSelfNonDot, prevOrSelfConsonant, prevOrSelfVowel
-    #    for the language level we are currently considering)
-    lang = feature.split("_")[0]
-    removed_indices = [i for i, x in enumerate(header)
-                       if x.startswith(lang + "_itself") or
-                       x.startswith(lang + "_prevOrSelf")]
-    label_col = header.index(feature)
-    removed_indices.append(label_col)
-
-    data_cols = list(range(len(header)))
-    data_cols = [x for i, x in enumerate(data_cols)
-                 if i not in removed_indices]
-    header = [header[i] for i in range(len(header))
-              if i not in removed_indices]
-
-    labels = np.loadtxt(in_file,
-                        delimiter=",",
-                        dtype=np.int32,
-                        skiprows=1,  # skip the header row
-                        usecols=label_col)
-    data = np.loadtxt(in_file,
-                      delimiter=",",
-                      dtype=np.int32,
-                      skiprows=1,
-                      usecols=data_cols)
+    if schema is None:
+        schema = feature_schema.from_file(in_file)
+    data_cols, label_col = schema.data_columns(feature)
+    header = schema.feature_names(feature)
 
-    # get the names of the classes  that actually appear in the data
-    unique = np.unique(labels).tolist()
-    class_names = [types[i] for i in unique]
-
-    clf = tree.DecisionTreeClassifier(
-        criterion='entropy',
-        min_samples_leaf=0.01)
-    clf = clf.fit(data, labels)
-    with open('evaluation/classifiers/' + feature_name_with_lang +
-              '.pickle', 'wb') as handle:
+    if matrix is None:
+        matrix = load_matrix(in_file)
+    labels = matrix[:, label_col]
+    data = matrix[:, data_cols]
+
+    clf = train_model(data, labels, params, engine, n_jobs)
+    clf_file = 'evaluation/classifiers/' + feature_name_with_lang
+    with open(clf_file + '.pickle', 'wb') as handle:
         pickle.dump(clf, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    save_lookup(clf, data, clf_file)
+    if engine in ensembles:
+        # the rules describe the predictions of the ensemble
+        labels = clf.predict(data)
+        clf = surrogate_tree(data, labels, params)
+        with open(clf_file + '_surrogate.pickle', 'wb') as handle:
+            pickle.dump(clf, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # get the names of the classes  that actually appear in the data
+    class_names = [types[i] for i in clf.classes_]
 
-    dot_data = tree.export_graphviz(clf,
-                                    out_file=None,
-                                    feature_names=header,
-                                    class_names=class_names,
-                                    # colour (class), saturation (certainty)
-                                    filled=True,
-                                    rounded=True,
-                                    special_characters=True)
-    graph = graphviz.Source(dot_data)
     outfile = out_dir + '/' + feature_name_with_lang
-    graph.render(outfile)
+    # graphviz can only draw sklearn trees
+    if isinstance(clf, tree.DecisionTreeClassifier):
+        dot_data = tree.export_graphviz(clf,
+                                        out_file=None,
+                                        feature_names=header,
+                                        class_names=class_names,
+                                        # colour (class),
+                                        # saturation (certainty)
+                                        filled=True,
+                                        rounded=True,
+                                        special_characters=True)
+        graph = graphviz.Source(dot_data)
+        graph.render(outfile)
 
-    tree_rules = rules.get_rules(clf, class_names, header)
+    tree_rules = rules.get_rules(clf, class_names, header,
+                                 data=data, labels=labels)
     outfile += '_rules.txt'
     with open(outfile, 'w', encoding='utf-8') as f:
         for rule in tree_rules:
             f.write(rule + '\n')
 
 
-def build_trees(in_file, out_dir):
+def build_multi_output_tree(in_file, out_dir, lang, params=None,
+                            schema=None, engine='tree', n_jobs=None,
+                            matrix=None):
+    """
+    Builds a single tree that predicts all phonetic features of `lang` at
+    once, and extracts the rules for each of the features.
+    The tree is saved in evaluation/classifiers/{lang}_all.pickle.
+    With engine='forest', a multi-output random forest is trained instead
+    (gradient boosting and categorical trees do not support several
+    outputs). `matrix` is the content of the feature file, as in build_tree.
+    """
+    print("Building the multi-output tree for {}.".format(lang))
+
+    if schema is None:
+        schema = feature_schema.from_file(in_file)
+    # The excluded columns are the same for all features of a language.
+    label_features = schema.label_names(lang)
+    data_cols, _ = schema.data_columns(label_features[0])
+    label_cols = schema.label_columns(lang)
+    data_header = schema.feature_names(label_features[0])
+
+    if matrix is None:
+        matrix = load_matrix(in_file)
+    data = matrix[:, data_cols]
+    labels = matrix[:, label_cols]
+    clf = train_model(data, labels, params, engine, n_jobs)
+    clf_file = 'evaluation/classifiers/' + lang + '_all'
+    with open(clf_file + '.pickle', 'wb') as handle:
+        pickle.dump(clf, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    save_lookup(clf, data, clf_file)
+    if engine in ensembles:
+        labels = clf.predict(data)
+        clf = surrogate_tree(data, labels, params)
+        with open(clf_file + '_surrogate.pickle', 'wb') as handle:
+            pickle.dump(clf, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    for output, (key, types) in enumerate(features_dict.items()):
+        class_names = [types[i] for i in clf.classes_[output]]
+        tree_rules = rules.get_rules(clf, class_names, data_header, output,
+                                     data, labels[:, output])
+        outfile = '{}/{}_{}_rules.txt'.format(out_dir, lang, key)
+        with open(outfile, 'w', encoding='utf-8') as f:
+            for rule in tree_rules:
+                f.write(rule + '\n')
+
+
+def save_lookup(clf, data, clf_file):
+    """
+    Saves the tree as a lookup.LookupTree containing the keys of the
+    training rows in {clf_file}_lookup.pickle, which the evaluation uses
+    instead of the tree. Ensembles cannot be turned into lookup tables,
+    so an old lookup table of the same feature is removed.
+    """
+    lookup_file = clf_file + '_lookup.pickle'
+    table = None
+    if hasattr(clf, 'tree_'):
+        try:
+            table = lookup.LookupTree(clf, data)
+        except ValueError as e:
+            print("\t{}".format(e))
+    if table is None:
+        if os.path.exists(lookup_file):
+            os.remove(lookup_file)
+        return
+    with open(lookup_file, 'wb') as handle:
+        pickle.dump(table, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_matrix(in_file):
+    """Reads the feature file (without the header row) into a numpy matrix."""
+    return np.loadtxt(in_file,
+                      delimiter=",",
+                      dtype=np.int32,
+                      skiprows=1,  # skip the header row
+                      ndmin=2)
+
+
+def reduce_columns(matrix, schema):
+    """
+    Leaves out the training columns that cannot help the trees: columns that
+    have the same value in every row of the feature matrix, and columns that
+    are identical to an earlier one. The returned schema (see
+    feature_schema.FeatureSchema.reduced) selects the remaining columns, so
+    that the rules still use the original column names.
+    """
+    schema = schema.reduced(matrix)
+    for lang, dropped in schema.dropped.items():
+        n_constant = sum(1 for col in dropped.values() if col is None)
+        print("Leaving out {} constant and {} duplicate columns for {}."
+              .format(n_constant, len(dropped) - n_constant, lang))
+    return schema
+
+
+def train_tree(data, labels, params=None, deduplicate=True):
+    """
+    Fits a decision tree to the given training data.
+
+    Identical rows (with identical labels) are merged, and their number is
+    used as the sample weight. The parameters are adjusted so that the
+    resulting tree is the same as the one fitted to all rows.
+
+    Keyword arguments:
+    data: A numpy matrix containing the training columns.
+    labels: A numpy array containing the labels (or a matrix, one column
+            per output).
+    params: A dict of DecisionTreeClassifier parameters that replace
+            the defaults in `default_params` (default: None).
+    deduplicate: Merge identical rows (default: True).
+    """
+    params = dict(default_params, **(params or {}))
+    n_samples = len(data)
+    if deduplicate:
+        weighted = weighted_params(params, n_samples)
+        if weighted is not None:
+            data, labels, weights = unique_rows(data, labels)
+            clf = tree.DecisionTreeClassifier(**weighted)
+            return clf.fit(data, labels, sample_weight=weights)
+    clf = tree.DecisionTreeClassifier(**params)
+    return clf.fit(data, labels)
+
+
+def train_model(data, labels, params=None, engine='tree', n_jobs=None):
+    """
+    Fits a classifier of the given engine (one of `engines`) to the training
+    data: a decision tree (train_tree), a random forest, a histogram
+    gradient boosting classifier (which treats all columns as categorical)
+    or a decision tree with set splits (train_categorical_tree).
+
+    Keyword arguments:
+    data: A numpy matrix containing the training columns.
+    labels: A numpy array containing the labels (or, for trees and forests,
+            a matrix, one column per output).
+    params: A dict of parameters for the classifier that replace the
+            defaults in `default_params`, `forest_params` or
+            `boosting_params` (default: None).
+    engine: 'tree', 'forest', 'boosting' or 'categorical'
+            (default: 'tree').
+    n_jobs: The number of threads a forest is trained with, unless `params`
+            contains n_jobs (default: None, i.e. one; -1 means all CPUs).
+    """
+    if engine not in engines:
+        raise ValueError("Unknown engine: {}".format(engine))
+    if engine == 'categorical':
+        return train_categorical_tree(data, labels, params)
+    if engine == 'tree' or len(np.unique(labels)) < 2:
+        # there is nothing to learn for an ensemble if there is only one class
+        return train_tree(data, labels, params if engine == 'tree' else None)
+    if engine == 'forest':
+        forest = dict(forest_params, **(params or {}))
+        forest.setdefault('n_jobs', n_jobs)
+        clf = ensemble.RandomForestClassifier(**forest)
+        clf.fit(data, labels)
+        # The forest is applied with a single thread, since the evaluation
+        # runs in several processes.
+        clf.n_jobs = None
+        return clf
+    if labels.ndim > 1:
+        raise ValueError("Gradient boosting does not support several outputs.")
+    # the columns contain the (small) integer codes of nominal features
+    categorical = np.ones(data.shape[1], dtype=bool)
+    clf = ensemble.HistGradientBoostingClassifier(
+        **dict(boosting_params, categorical_features=categorical,
+               **(params or {})))
+    return clf.fit(data, labels)
+
+
+def train_categorical_tree(data, labels, params=None):
+    """
+    Fits a categorical.CategoricalTree to the given training data. Like in
+    train_tree, identical rows are merged and weighted by their number.
+
+    Keyword arguments:
+    data: A numpy matrix containing the training columns.
+    labels: A numpy array containing the labels.
+    params: A dict of CategoricalTree parameters that replace the defaults
+            in `default_params` (default: None).
+    """
+    if np.ndim(labels) > 1:
+        raise ValueError("Categorical trees do not support several outputs.")
+    params = dict(default_params, **(params or {}))
+    data, labels, weights = unique_rows(data, labels)
+    clf = categorical.CategoricalTree(**params)
+    return clf.fit(data, labels, sample_weight=weights)
+
+
+def surrogate_tree(data, predictions, params=None):
+    """
+    Fits a decision tree to the predictions of an ensemble on its training
+    data, so that the ensemble can be described by rules. Of the ensemble's
+    parameters, only the ones a DecisionTreeClassifier accepts
+    (e.g. min_samples_leaf, but not n_estimators) are used.
+    """
+    tree_params = tree.DecisionTreeClassifier().get_params()
+    return train_tree(data, predictions,
+                      {key: value for key, value in (params or {}).items()
+                       if key in tree_params})
+
+
+def unique_rows(data, labels):
+    """
+    Merges identical rows of the training data.
+
+    Returns:
+    The unique rows, their labels and the number of times they occur.
+    """
+    n_data_cols = data.shape[1]
+    rows = np.ascontiguousarray(np.column_stack((data, labels)))
+    # view each row as a single value, so that np.unique compares whole rows
+    packed = rows.view(np.dtype((np.void, rows.dtype.itemsize *
+                                 rows.shape[1]))).ravel()
+    _, index, counts = np.unique(packed, return_index=True,
+                                 return_counts=True)
+    unique = rows[index]
+    labels = unique[:, n_data_cols:]
+    if labels.shape[1] == 1:
+        labels = labels.ravel()
+    return unique[:, :n_data_cols], labels, counts.astype(float)
+
+
+def weighted_params(params, n_samples):
+    """
+    Translates the DecisionTreeClassifier parameters for training on
+    `n_samples` rows into ones for training on the merged rows with sample
+    weights: the minimum number of rows per leaf becomes a minimum weight.
+
+    Returns:
+    The new parameters, or None if they cannot be translated.
+    """
+    min_samples_split = params.get('min_samples_split', 2)
+    if not (min_samples_split == 2 and isinstance(min_samples_split, int)):
+        return None
+    min_samples_leaf = params.get('min_samples_leaf', 1)
+    if isinstance(min_samples_leaf, float):
+        min_samples_leaf = int(np.ceil(min_samples_leaf * n_samples))
+    if min_samples_leaf <= 1 or n_samples == 0:
+        return dict(params)
+    # The leaves need a weight of at least min_samples_leaf. The weights are
+    # integers, so any threshold in (min_samples_leaf - 0.5,
+    # min_samples_leaf] has the same effect, including on which nodes are
+    # too small to be split (weight < 2 * threshold).
+    min_weight_fraction = (min_samples_leaf - 0.25) / n_samples
+    return dict(params, min_samples_leaf=1,
+                min_weight_fraction_leaf=max(
+                    min_weight_fraction,
+                    params.get('min_weight_fraction_leaf', 0.0)))
+
+
+def train_trees(data, header, languages, params=None, multi_output=False,
+                engine='tree', n_jobs=None):
+    """
+    Fits the decision trees for all phonetic features of the given languages
+    to a feature matrix that is already in memory.
+
+    Keyword arguments:
+    data: A numpy matrix with the columns described by `header`.
+    header: A list(str) as created by features.header_list,
+            or a feature_schema.FeatureSchema.
+    languages: The languages to build the trees for.
+    params: A dict of DecisionTreeClassifier parameters (or parameters of
+            the classifiers of the engine) (default: None).
+    multi_output: If True, a single tree predicts all phonetic features
+                  of a language (default: False).
+    engine, n_jobs: see train_model (default: 'tree', None).
+
+    Returns:
+    A dict(str -> dict(str -> DecisionTreeClassifier)) mapping the languages
+    and feature names to the classifiers, or, if multi_output,
+    a dict(str -> DecisionTreeClassifier) mapping the languages to the
+    multi-output classifiers.
+    """
+    schema = header
+    if not isinstance(schema, feature_schema.FeatureSchema):
+        schema = feature_schema.FeatureSchema(header)
+    classifiers = {}
+    for lang in languages:
+        if multi_output:
+            data_cols, _ = schema.data_columns(schema.label_names(lang)[0])
+            classifiers[lang] = train_model(
+                data[:, data_cols], data[:, schema.label_columns(lang)],
+                params, engine, n_jobs)
+            continue
+        classifiers[lang] = {}
+        for feature_name in features_dict:
+            feature = "{}_itself_{}".format(lang, feature_name)
+            data_cols, label_col = schema.data_columns(feature)
+            classifiers[lang][feature_name] = train_model(
+                data[:, data_cols], data[:, label_col], params, engine,
+                n_jobs)
+    return classifiers
+
+
+def build_trees(in_file, out_dir, multi_output=False, engine='tree',
+                n_jobs=-1):
+    if multi_output and engine in ('boosting', 'categorical'):
+        raise ValueError("The {} engine does not support several outputs."
+                         .format(engine))
     languages = simple_file_name(in_file).split("-")[:2]
+    # the columns the trees are trained on, needed for using them later
+    # the feature file is read once for all trees
+    matrix = load_matrix(in_file)
+    schema = reduce_columns(matrix, feature_schema.from_file(in_file))
+    for language in languages:
+        schema.save('evaluation/classifiers/{}_schema.pickle'
+                    .format(language))
+    if multi_output:
+        for language in languages:
+            build_multi_output_tree(in_file, out_dir, language, schema=schema,
+                                    engine=engine, n_jobs=n_jobs,
+                                    matrix=matrix)
+        print("Done.")
+        return
     features = ["{}_itself_{}".format(language, key)
                 for language in languages
                 for key in features_dict]
     for feature in features:
         types = features_dict[feature.split("_")[-1]]
-        build_tree(in_file, out_dir, feature, types)
+        build_tree(in_file, out_dir, feature, types, schema=schema,
+                   engine=engine, n_jobs=n_jobs, matrix=matrix)
     print("Done.")
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        sys.stderr.write('Usage: %s FEATURES OUTPUT_DIR\n' % sys.argv[0])
+        sys.stderr.write('Usage: %s FEATURES OUTPUT_DIR [multi] '
+                         '[forest | boosting | categorical] [N_JOBS]\n' % sys.argv[0])
         sys.exit(1)
-    build_trees(sys.argv[1], sys.argv[2])
+    options = sys.argv[3:]
+    n_jobs = [int(option) for option in options if option.lstrip('-').isdigit()]
+    build_trees(sys.argv[1], sys.argv[2], 'multi' in options,
+                ([option for option in options if option in engines] +
+                 ['tree'])[0],
+                n_jobs[0] if n_jobs else -1)